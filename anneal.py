@@ -0,0 +1,173 @@
+import math
+import random
+from typing import List, Dict, Tuple
+
+from anytime import Deadline, ImprovementCallback, Incumbent
+from cost import RouteCostModel
+from greedy import GreedyAmusementParkOptimizer
+from moves import EPSILON, RouteState
+
+
+class SimulatedAnnealingOptimizer:
+    """Simulated annealing over single random insert, remove, swap and 2-opt moves.
+
+    Routes are ranked by rides first, then time, so a feasible insert is always taken.
+    Removing a ride is accepted by the Metropolis rule on a loss of one ride, softened by
+    the time it frees in units of the mean least cost of a desired ride, so the search can
+    still trade a ride for a shorter route and refill it while it is hot. Swaps and 2-opt
+    reversals are accepted on their time change in the same unit. Infeasible moves are
+    never taken. Each move is priced from the route's prefix times and only accepted moves
+    touch the route, so an iteration costs microseconds.
+
+    The run starts from the greedy route unless given ``initial_solutions``, and ends with
+    a descent from the best route: cheapest feasible inserts, then improving swaps and
+    reversals, until neither helps.
+    """
+
+    def __init__(
+            self,
+            desired_rides: List[int],
+            time_limit: int,
+            ride_durations: List[int],
+            travel_times: List[List[int]],
+            ride_categories: List[str],
+            category_delays: Dict[str, int],
+            day: str,
+            day_category_effects: Dict[str, str],
+            cost_model: RouteCostModel = None,
+    ):
+        self.desired_rides = desired_rides
+        self.time_limit = time_limit
+        self.ride_durations = ride_durations
+        self.travel_times = travel_times
+        self.ride_categories = ride_categories
+        self.category_delays = category_delays
+        self.day = day
+        self.day_category_effects = day_category_effects
+        self.iterations = 50000
+        # Temperature falls geometrically from the first to the second over the run
+        self.temperatures = (0.3, 0.003)
+        # Relative odds of insert, remove, swap and reverse moves
+        self.move_weights = (0.3, 0.1, 0.3, 0.3)
+        # Routes to start from instead of the greedy one, e.g. a cached route
+        self.initial_solutions: List[List[int]] = []
+        self.path = []
+        self.total_time = 0
+        # Called as observer(event, **values) with convergence events, see instrument.Profile
+        self.observer = None
+        # Optional greedy.NeighborIndex for the greedy seed, e.g. a ParkCache's
+        self.neighbor_index = None
+        if cost_model is None:
+            cost_model = RouteCostModel(ride_durations, travel_times, ride_categories, category_delays, day,
+                                        day_category_effects)
+        self.cost_model = cost_model
+
+    def initial_solution(self) -> List[int]:
+        for route in self.initial_solutions:
+            if self.cost_model.route_time(route) <= self.time_limit:
+                return list(route)
+        greedy = GreedyAmusementParkOptimizer(self.desired_rides, self.time_limit, self.ride_durations,
+                                              self.travel_times, self.ride_categories, self.category_delays,
+                                              self.day, self.day_category_effects, cost_model=self.cost_model,
+                                              neighbor_index=self.neighbor_index)
+        greedy.run()
+        if self.cost_model.route_time(greedy.path) <= self.time_limit + EPSILON:
+            return list(greedy.path)
+        return []
+
+    def descend(self, state: RouteState, missing: List[int], deadline: Deadline):
+        """Apply the cheapest feasible insert, else the best improving swap or reversal, until none is left."""
+        limit = self.time_limit + EPSILON
+        while not deadline.expired():
+            best = None
+            for ride in missing:
+                for position in range(len(state.route) + 1):
+                    move = state.insert(ride, position)
+                    if state.total_time + move.delta <= limit and (best is None or move.delta < best.delta):
+                        best = move
+            if best is not None:
+                state.apply(best)
+                missing.remove(best.ride)
+                continue
+            length = len(state.route)
+            for i in range(length):
+                for j in range(i + 1, length):
+                    for move in (state.swap(i, j), state.reverse(i, j)):
+                        if move.delta < -EPSILON and (best is None or move.delta < best.delta):
+                            best = move
+            if best is None:
+                return
+            state.apply(best)
+
+    def run(self, time_budget: float = None, on_improvement: ImprovementCallback = None) -> Tuple[int, float]:
+        """Anneal for ``iterations`` moves; ``time_budget`` (seconds) stops early with the best route."""
+        deadline = Deadline(time_budget)
+        incumbent = Incumbent(on_improvement)
+        state = RouteState(self.cost_model, self.initial_solution())
+        incumbent.offer(state.route, state.total_time)
+        rides = list(dict.fromkeys(self.desired_rides))
+        in_route = set(state.route)
+        missing = [ride for ride in rides if ride not in in_route]
+
+        time_scale = 1 / float(self.cost_model.min_ride_costs(rides).mean()) if rides else 0.0
+        limit = self.time_limit + EPSILON
+        start_temperature, end_temperature = self.temperatures
+        cooling = (end_temperature / start_temperature) ** (1 / max(self.iterations - 1, 1))
+        temperature = start_temperature
+        insert_odds, remove_odds, swap_odds, _ = self.move_weights
+        total_odds = sum(self.move_weights)
+        remove_at = (insert_odds + remove_odds) / total_odds
+        swap_at = (insert_odds + remove_odds + swap_odds) / total_odds
+        insert_at = insert_odds / total_odds
+
+        for iteration in range(self.iterations):
+            if not iteration & 255 and deadline.expired():
+                break
+            temperature *= cooling
+            length = len(state.route)
+            pick = random.random()
+
+            if pick < insert_at:
+                if not missing:
+                    continue
+                slot = random.randrange(len(missing))
+                move = state.insert(missing[slot], random.randrange(length + 1))
+                change = 1
+            elif pick < remove_at:
+                if not length:
+                    continue
+                move = state.remove(random.randrange(length))
+                # Always a loss, the smaller the more time it frees
+                change = -1 / (1 - move.delta * time_scale)
+            else:
+                if length < 2:
+                    continue
+                i, j = sorted(random.sample(range(length), 2))
+                move = state.swap(i, j) if pick < swap_at else state.reverse(i, j)
+                change = -move.delta * time_scale
+
+            if state.total_time + move.delta > limit:
+                continue
+            if change < 0 and random.random() >= math.exp(change / temperature):
+                continue
+
+            state.apply(move)
+            if move.kind == 'insert':
+                missing[slot] = missing[-1]
+                missing.pop()
+            elif move.kind == 'remove':
+                missing.append(move.ride)
+            if incumbent.offer(state.route, state.total_time) and self.observer is not None:
+                self.observer('improvement', iteration=iteration, rides=len(state.route),
+                              total_time=state.total_time, temperature=temperature)
+
+        state = RouteState(self.cost_model, incumbent.path)
+        in_route = set(state.route)
+        self.descend(state, [ride for ride in rides if ride not in in_route], deadline)
+        incumbent.offer(state.route, state.total_time)
+
+        best_solution = incumbent.path
+        total_time = self.cost_model.route_time(best_solution)
+        self.path = best_solution
+        self.total_time = total_time
+        return len(best_solution), total_time
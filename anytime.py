@@ -0,0 +1,43 @@
+import time
+from typing import Callable, List, Optional, Tuple
+
+# Called as on_improvement(path, num_rides, total_time) whenever the best route improves
+ImprovementCallback = Callable[[List[int], int, float], None]
+
+
+class Deadline:
+    """Wall-clock deadline for a time-budgeted run; no budget means it never expires.
+
+    ``at`` is a ``time.time()`` value so it can be handed to worker processes.
+    """
+
+    def __init__(self, time_budget: float = None):
+        self.at: Optional[float] = time.time() + time_budget if time_budget is not None else None
+
+    def expired(self) -> bool:
+        return self.at is not None and time.time() >= self.at
+
+    def remaining(self) -> float:
+        return float('inf') if self.at is None else max(self.at - time.time(), 0.0)
+
+
+class Incumbent:
+    """Best route seen so far, ranked by (rides, -total time)."""
+
+    def __init__(self, on_improvement: ImprovementCallback = None):
+        self.on_improvement = on_improvement
+        self.path: List[int] = []
+        self.total_time = 0
+        self.score: Tuple[int, float] = (0, 0)
+
+    def offer(self, path: List[int], total_time: float) -> bool:
+        """Keep ``path`` if it beats the incumbent and report it; returns whether it did."""
+        score = (len(path), -total_time)
+        if score <= self.score:
+            return False
+        self.path = list(path)
+        self.total_time = total_time
+        self.score = score
+        if self.on_improvement is not None:
+            self.on_improvement(list(path), len(path), total_time)
+        return True
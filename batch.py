@@ -0,0 +1,107 @@
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from cache import ParkCache
+from parkio import load_park
+from runner import RouteResult, build_optimizer
+from util import ParkData, UserData
+
+
+def _group_by_day(indexed_users: List[Tuple[int, UserData]]) -> List[List[Tuple[int, UserData]]]:
+    """Split users by visit day so each group reuses a single per-day cost model."""
+    groups: Dict[str, List[Tuple[int, UserData]]] = {}
+    for index, user_data in indexed_users:
+        groups.setdefault(user_data.visit_day, []).append((index, user_data))
+    return list(groups.values())
+
+
+def _solve_group(park_data: ParkData, cache: ParkCache, algorithm: str, indexed_users: List[Tuple[int, UserData]],
+                 seed: int) -> List[Tuple[int, RouteResult]]:
+    results = []
+    for index, user_data in indexed_users:
+        # Seeded per user, so a result doesn't depend on batching or worker count
+        random.seed(f"{seed}:{index}")
+        optimizer = build_optimizer(algorithm, park_data, user_data, cache=cache)
+        num_rides, total_time = optimizer.run()
+        results.append((index, RouteResult(optimizer.path, num_rides, total_time)))
+    return results
+
+
+# Set in each batch worker by _init_batch_worker
+_worker_park: ParkData = None
+_worker_cache: ParkCache = None
+
+
+def _as_park(park: Union[ParkData, str]) -> ParkData:
+    # A path is loaded memory-mapped, so every worker shares one copy of the travel matrix
+    if isinstance(park, (str, os.PathLike)):
+        return load_park(park)
+    return park
+
+
+def _init_batch_worker(park: Union[ParkData, str]):
+    global _worker_park, _worker_cache
+    _worker_park = _as_park(park)
+    _worker_cache = ParkCache(max_parks=1)
+
+
+def _solve_on_worker(algorithm: str, indexed_users: List[Tuple[int, UserData]], seed: int):
+    return _solve_group(_worker_park, _worker_cache, algorithm, indexed_users, seed)
+
+
+def iter_optimize_batch(park_data: Union[ParkData, str], users: Iterable[UserData], algorithm: str = 'greedy',
+                        max_workers: int = None, chunk_size: int = 256, seed: int = 0) -> Iterator[RouteResult]:
+    """Optimize a stream of user requests against one park, yielding results in input order.
+
+    Users are read ``chunk_size`` at a time and each chunk is split by visit day. The park
+    is sent to every worker once and its precomputation is cached there, so per-user work
+    is only the optimization itself. At most two chunks per worker are in flight, which
+    bounds memory for arbitrarily long streams. ``max_workers=1`` runs in this process.
+
+    ``park_data`` may also be the path of a park saved with ``parkio.save_park``; workers
+    then memory-map it instead of each receiving a pickled copy.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    users = iter(users)
+    chunks = iter(lambda: list(islice(users, chunk_size)), [])
+    start = 0
+
+    if max_workers == 1:
+        park_data = _as_park(park_data)
+        cache = ParkCache(max_parks=1)
+        for chunk in chunks:
+            results = []
+            for group in _group_by_day(list(enumerate(chunk, start))):
+                results.extend(_solve_group(park_data, cache, algorithm, group, seed))
+            start += len(chunk)
+            yield from (result for _, result in sorted(results, key=lambda item: item[0]))
+        return
+
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_batch_worker,
+                             initargs=(park_data,)) as executor:
+        for chunk in chunks:
+            pending.append([
+                executor.submit(_solve_on_worker, algorithm, group, seed)
+                for group in _group_by_day(list(enumerate(chunk, start)))
+            ])
+            start += len(chunk)
+            if len(pending) > 2 * max_workers:
+                yield from _collect(pending.popleft())
+        while pending:
+            yield from _collect(pending.popleft())
+
+
+def _collect(futures) -> Iterator[RouteResult]:
+    results = [item for future in futures for item in future.result()]
+    return (result for _, result in sorted(results, key=lambda item: item[0]))
+
+
+def optimize_batch(park_data: Union[ParkData, str], users: Iterable[UserData], algorithm: str = 'greedy',
+                   max_workers: int = None, chunk_size: int = 256, seed: int = 0) -> List[RouteResult]:
+    """Optimize every user in ``users`` against ``park_data``; see :func:`iter_optimize_batch`."""
+    return list(iter_optimize_batch(park_data, users, algorithm, max_workers, chunk_size, seed))
@@ -0,0 +1,192 @@
+"""Reproducible benchmark of the optimizers on quality and speed.
+
+Runs every algorithm on a fixed, seeded corpus of parks and users per park size and
+writes latency percentiles, throughput, peak memory and solution quality to JSON.
+Pass ``--baseline`` with an earlier results file to fail on regressions, e.g.::
+
+    python benchmark.py --output bench_new.json --baseline bench_old.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from runner import build_optimizer
+from util import ParkData, UserData
+
+DEFAULT_SIZES = [10, 20, 40, 100, 200]
+DEFAULT_ALGORITHMS = ['greedy', 'hill', 'anneal', 'genetic', 'genetic_vec', 'exact']
+# Smallest time budget in minutes, so several rides fit even in the smallest parks
+MIN_BUDGET = 90
+
+
+def generate_corpus(size: int, num_cases: int):
+    """Seeded (park, user) pairs for one park size; identical on every run and commit."""
+    corpus = []
+    for case in range(num_cases):
+        random.seed(f"benchmark:{size}:{case}")
+        park_data = ParkData(f"bench-{size}-{case}", size)
+        desired_rides = random.sample(range(size), max(1, size // 2))
+        # Rides cost about 20 minutes each, so at least four fit and, from 30 rides on, roughly
+        # one in seven, so routes grow with the park
+        budget = max(MIN_BUDGET, 3 * size)
+        user_data = UserData(size, desired_rides, budget, random.choice(list(park_data.day_category_affect)))
+        corpus.append((park_data, user_data))
+    return corpus
+
+
+def is_supported(algorithm: str, park_data: ParkData, user_data: UserData) -> bool:
+    if algorithm != 'exact':
+        return True
+    return len(set(user_data.desired_rides)) <= build_optimizer(algorithm, park_data, user_data).max_rides
+
+
+def timed_run(algorithm: str, park_data: ParkData, user_data: UserData, run_seed: str, warm_start: bool = False):
+    random.seed(run_seed)
+    start_time = time.perf_counter()
+    optimizer = build_optimizer(algorithm, park_data, user_data, warm_start=warm_start)
+    num_rides, total_time = optimizer.run()
+    return time.perf_counter() - start_time, num_rides, total_time
+
+
+def peak_memory(algorithm: str, park_data: ParkData, user_data: UserData, run_seed: str,
+                warm_start: bool = False) -> int:
+    # Traced separately: tracemalloc slows the run down too much to time it
+    tracemalloc.start()
+    try:
+        timed_run(algorithm, park_data, user_data, run_seed, warm_start)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_size(size: int, algorithms, num_cases: int, repeats: int, warmup: int, warm_start: bool = False):
+    corpus = generate_corpus(size, num_cases)
+    measurements = {}
+    for algorithm in algorithms:
+        latencies, rides, times, memory = [], [], [], []
+        for case, (park_data, user_data) in enumerate(corpus):
+            if not is_supported(algorithm, park_data, user_data):
+                rides.append(None)
+                continue
+            run_seed = f"run:{size}:{case}"
+            for _ in range(warmup):
+                timed_run(algorithm, park_data, user_data, run_seed, warm_start)
+            for _ in range(repeats):
+                latency, num_rides, total_time = timed_run(algorithm, park_data, user_data, run_seed, warm_start)
+                latencies.append(latency)
+            rides.append(num_rides)
+            times.append(total_time)
+            memory.append(peak_memory(algorithm, park_data, user_data, run_seed, warm_start))
+        measurements[algorithm] = (latencies, rides, times, memory)
+
+    # Best known ride count per case across all algorithms (the exact solver when it ran)
+    best_known = [max((measurements[algorithm][1][case] or 0) for algorithm in algorithms)
+                  for case in range(num_cases)]
+
+    results = []
+    for algorithm in algorithms:
+        latencies, rides, times, memory = measurements[algorithm]
+        if not latencies:
+            continue
+        gaps = [(best - found) / best for best, found in zip(best_known, rides) if found is not None and best]
+        results.append({
+            'algorithm': algorithm,
+            'size': size,
+            'cases': sum(found is not None for found in rides),
+            'runs': len(latencies),
+            'latency_mean': float(np.mean(latencies)),
+            'latency_p50': float(np.percentile(latencies, 50)),
+            'latency_p90': float(np.percentile(latencies, 90)),
+            'latency_p99': float(np.percentile(latencies, 99)),
+            'throughput': len(latencies) / sum(latencies),
+            'peak_memory_bytes': max(memory),
+            'rides_mean': float(np.mean([found for found in rides if found is not None])),
+            'time_mean': float(np.mean(times)),
+            'gap_to_best_known': float(np.mean(gaps)) if gaps else 0.0,
+        })
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, baseline, tolerance: float, latency_floor: float = 0.001):
+    """Return regressions of ``results`` against ``baseline``: slower p50 latency or worse quality.
+
+    A p50 only counts as slower when it grew by both ``tolerance`` (relative) and
+    ``latency_floor`` seconds, so sub-millisecond runs don't fail on timer noise.
+    """
+    previous = {(entry['algorithm'], entry['size']): entry for entry in baseline['results']}
+    regressions = []
+    for entry in results['results']:
+        old = previous.get((entry['algorithm'], entry['size']))
+        if old is None:
+            continue
+        name = f"{entry['algorithm']} @ {entry['size']} rides"
+        if entry['latency_p50'] > max(old['latency_p50'] * (1 + tolerance), old['latency_p50'] + latency_floor):
+            regressions.append(f"{name}: p50 latency {old['latency_p50']:.4f}s -> {entry['latency_p50']:.4f}s")
+        if entry['rides_mean'] < old['rides_mean'] - 1e-9:
+            regressions.append(f"{name}: mean rides {old['rides_mean']:.2f} -> {entry['rides_mean']:.2f}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--algorithms', nargs='+', default=DEFAULT_ALGORITHMS)
+    parser.add_argument('--cases', type=int, default=3, help='parks per size')
+    parser.add_argument('--repeats', type=int, default=3, help='timed runs per park')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed runs per park')
+    parser.add_argument('--warm-start', action='store_true', help='seed hill climbing and the GAs with greedy routes')
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--baseline', help='earlier results file to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative p50 slowdown')
+    parser.add_argument('--latency-floor', type=float, default=0.001,
+                        help='p50 slowdown in seconds always allowed, for sub-millisecond runs')
+    args = parser.parse_args(argv)
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'config': vars(args),
+        },
+        'results': [],
+    }
+    for size in args.sizes:
+        for entry in benchmark_size(size, args.algorithms, args.cases, args.repeats, args.warmup,
+                                    args.warm_start):
+            results['results'].append(entry)
+            print(f"{entry['algorithm']:>12} {size:>5} rides  p50 {entry['latency_p50'] * 1000:9.2f} ms  "
+                  f"p99 {entry['latency_p99'] * 1000:9.2f} ms  rides {entry['rides_mean']:6.2f}  "
+                  f"gap {entry['gap_to_best_known']:6.1%}  mem {entry['peak_memory_bytes'] / 1024:8.0f} KiB")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.latency_floor)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+from typing import List, Dict, Tuple
+
+from anytime import Deadline, ImprovementCallback, Incumbent
+from cost import RouteCostModel
+from greedy import GreedyAmusementParkOptimizer
+from moves import EPSILON
+
+
+class _SearchLimit(Exception):
+    pass
+
+
+class BranchAndBoundOptimizer:
+    """Depth-first branch and bound over route prefixes, for lists too long for the exact DP.
+
+    Each ride costs at least its duration plus its cheapest inbound walk, so the rides
+    still open, taken cheapest first, bound how many more fit in the time left and how
+    soon the incumbent's ride count could be reached. Nodes that can't beat the
+    incumbent (seeded with the greedy route) are pruned, as are prefixes that reach the
+    same ride set and last ride later than one seen before.
+
+    The dominance pruning assumes FIFO queue waits (see ``QueueModel.is_fifo``), so other
+    queue models are refused.
+
+    ``max_nodes`` and the run's ``time_budget`` cap the search; ``proven_optimal`` tells
+    whether it finished, in which case the route is optimal. A search cut short reports
+    a ``limit`` event to the observer and returns the best route found.
+    """
+
+    def __init__(
+            self,
+            desired_rides: List[int],
+            time_limit: int,
+            ride_durations: List[int],
+            travel_times: List[List[int]],
+            ride_categories: List[str],
+            category_delays: Dict[str, int],
+            day: str,
+            day_category_effects: Dict[str, str],
+            cost_model: RouteCostModel = None,
+    ):
+        self.desired_rides = desired_rides
+        self.time_limit = time_limit
+        self.ride_durations = ride_durations
+        self.travel_times = travel_times
+        self.ride_categories = ride_categories
+        self.category_delays = category_delays
+        self.day = day
+        self.day_category_effects = day_category_effects
+        # About a third of a second on a 30-ride list; raise it to prove longer lists optimal
+        self.max_nodes = 200_000
+        # Cap on remembered (ride set, last ride) states used for dominance pruning
+        self.max_states = 250_000
+        self.path = []
+        self.total_time = 0
+        self.nodes_explored = 0
+        self.proven_optimal = False
+        # Called as observer(event, **values) with convergence events, see instrument.Profile
+        self.observer = None
+        # Optional greedy.NeighborIndex for the greedy seed, e.g. a ParkCache's
+        self.neighbor_index = None
+        if cost_model is None:
+            cost_model = RouteCostModel(ride_durations, travel_times, ride_categories, category_delays, day,
+                                        day_category_effects)
+        self.cost_model = cost_model
+
+    def run(self, time_budget: float = None, on_improvement: ImprovementCallback = None) -> Tuple[int, float]:
+        """Search for the best route; ``time_budget`` (seconds) returns the best found so far."""
+        cost_model = self.cost_model
+        if cost_model.time_dependent and not cost_model.queue_model.is_fifo():
+            raise ValueError("Branch and bound needs FIFO queue waits, where arriving later never means finishing "
+                             "earlier.")
+        deadline = Deadline(time_budget)
+        incumbent = Incumbent(on_improvement)
+        rides = list(dict.fromkeys(self.desired_rides))
+
+        greedy = GreedyAmusementParkOptimizer(self.desired_rides, self.time_limit, self.ride_durations,
+                                              self.travel_times, self.ride_categories, self.category_delays,
+                                              self.day, self.day_category_effects, cost_model=cost_model,
+                                              neighbor_index=self.neighbor_index)
+        greedy.run()
+        incumbent.offer(greedy.path, cost_model.route_time(greedy.path))
+
+        self.nodes_explored = 0
+        self.proven_optimal = False
+        if rides:
+            try:
+                self._search(rides, incumbent, deadline)
+                self.proven_optimal = True
+            except _SearchLimit:
+                if self.observer is not None:
+                    self.observer('limit', nodes=self.nodes_explored, rides=incumbent.score[0])
+
+        best_solution = incumbent.path
+        total_time = cost_model.route_time(best_solution)
+        self.path = best_solution
+        self.total_time = total_time
+        return len(best_solution), total_time
+
+    def _search(self, rides: List[int], incumbent: Incumbent, deadline: Deadline):
+        cost_model = self.cost_model
+        time_limit = self.time_limit + EPSILON
+        time_dependent = cost_model.time_dependent
+        num_rides = len(rides)
+        costs = self.cost_model.min_ride_costs(rides).tolist()
+        by_cost = sorted(range(num_rides), key=costs.__getitem__)
+        travel = cost_model.travel_list
+        durations = cost_model.duration_list
+        # Earliest finish seen per (ride set, last ride), keyed as mask * num_rides + last
+        best_times: Dict[int, float] = {}
+        path: List[int] = []
+        observer = self.observer
+
+        def leg(previous: int, position: int, time: float) -> float:
+            if time_dependent:
+                return cost_model.leg_time(previous, rides[position], time)
+            return travel[previous][rides[position]] + durations[rides[position]]
+
+        def search(previous: int, mask: int, time: float):
+            self.nodes_explored += 1
+            if not self.nodes_explored & 1023 and (self.nodes_explored >= self.max_nodes or deadline.expired()):
+                raise _SearchLimit()
+
+            depth = len(path)
+            if (depth, -time) > incumbent.score:
+                incumbent.offer([rides[position] for position in path], time)
+                if observer is not None:
+                    observer('incumbent', rides=depth, total_time=time, nodes=self.nodes_explored)
+
+            # Bound: the cheapest open rides, in order, until the time left runs out
+            best_rides, best_time = incumbent.score[0], -incumbent.score[1]
+            needed = best_rides - depth
+            slack = time_limit - time
+            reachable = 0
+            spent = 0.0
+            spent_needed = 0.0
+            for position in by_cost:
+                if mask >> position & 1:
+                    continue
+                spent += costs[position]
+                if spent > slack:
+                    break
+                reachable += 1
+                if reachable == needed:
+                    spent_needed = spent
+            if depth + reachable < best_rides:
+                return
+            if depth + reachable == best_rides and (needed <= 0 or time + spent_needed >= best_time - EPSILON):
+                return
+
+            children = []
+            for position in range(num_rides):
+                if mask >> position & 1:
+                    continue
+                finish = time + leg(previous, position, time)
+                if finish <= time_limit:
+                    children.append((finish, position))
+            children.sort()
+            for finish, position in children:
+                state = (mask | 1 << position) * num_rides + position
+                seen = best_times.get(state)
+                if seen is not None and seen <= finish:
+                    continue
+                if seen is not None or len(best_times) < self.max_states:
+                    best_times[state] = finish
+                path.append(position)
+                search(rides[position], mask | 1 << position, finish)
+                path.pop()
+
+        search(cost_model.start_ride, 0, 0.0)
@@ -0,0 +1,125 @@
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from cost import RouteCostModel, as_travel_matrix
+from greedy import NeighborIndex
+from util import OPENING_MINUTE
+
+
+def _list_nbytes(rows: List[List[float]]) -> int:
+    """Rough size of a list-of-lists of floats: one pointer and one float object per entry."""
+    if not rows:
+        return 0
+    return len(rows) * (56 + 8 * len(rows[0]) + 24 * len(rows[0]))
+
+
+class ParkEntry:
+    """Everything derived from one park that no single user request depends on.
+
+    The travel matrix, its list mirror and the greedy neighbor index are built once, the
+    last two on first use, so a worker that never needs them doesn't pay for them;
+    per-day cost models are added lazily and share them. With queues, a visit starting
+    at another time gets a shifted copy of the day's model, and the wait rows are shared
+    by every model of the park.
+    """
+
+    def __init__(self, park_data):
+        self.park_ref = weakref.ref(park_data)
+        self.travel = as_travel_matrix(park_data.travel_times)
+        # Filled in place by the first cost model that needs it, see RouteCostModel.travel_list
+        self.travel_list: List[List[float]] = []
+        self._neighbor_index: Optional[NeighborIndex] = None
+        self.cost_models: Dict[str, RouteCostModel] = {}
+        self.wait_rows: Dict[int, List[float]] = {}
+
+    @property
+    def neighbor_index(self) -> NeighborIndex:
+        if self._neighbor_index is None:
+            self._neighbor_index = NeighborIndex(self.travel)
+        return self._neighbor_index
+
+    @property
+    def nbytes(self) -> int:
+        # Durations and penalties of each day, as arrays and as list mirrors, plus the wait rows built so far
+        days = sum(2 * (cost_model.durations.nbytes + 32 * cost_model.num_rides)
+                   for cost_model in self.cost_models.values())
+        nbytes = self.travel.nbytes + _list_nbytes(self.travel_list) + days + _list_nbytes(list(self.wait_rows.values()))
+        if self._neighbor_index is not None:
+            nbytes += self._neighbor_index.order.nbytes + self._neighbor_index.sorted_travel.nbytes
+        return nbytes
+
+    def cost_model(self, visit_day: str, start_minute: float = OPENING_MINUTE) -> RouteCostModel:
+        park_data = self.park_ref()
+        cost_model = self.cost_models.get(visit_day)
+        if cost_model is None:
+            cost_model = RouteCostModel(
+                park_data.ride_times,
+                self.travel,
+                park_data.ride_categories,
+                park_data.category_time_addition,
+                visit_day,
+                park_data.day_category_affect,
+                travel_list=self.travel_list,
+                queue_model=park_data.queue_model,
+                wait_rows=self.wait_rows,
+            )
+            self.cost_models[visit_day] = cost_model
+        # Without queues the start time doesn't change any cost, so the day's model serves every start
+        if park_data.queue_model is not None and start_minute != cost_model.start_minute:
+            return cost_model.starting_at(start_minute)
+        return cost_model
+
+
+class ParkCache:
+    """LRU cache of park precomputation, looked up by (park, visit_day).
+
+    Parks are identified by ``park_name``; a different ``ParkData`` object under a cached
+    name replaces the stale entry. Entries are evicted least recently used first once
+    there are more than ``max_parks`` of them or their estimated size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, max_parks: int = 32, max_bytes: Optional[int] = None):
+        self.max_parks = max_parks
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, ParkEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(entry.nbytes for entry in self.entries.values())
+
+    def park_entry(self, park_data) -> ParkEntry:
+        entry = self.entries.get(park_data.park_name)
+        if entry is not None and entry.park_ref() is park_data:
+            self.hits += 1
+            self.entries.move_to_end(park_data.park_name)
+            return entry
+        self.misses += 1
+        entry = ParkEntry(park_data)
+        self.entries[park_data.park_name] = entry
+        self.entries.move_to_end(park_data.park_name)
+        self._evict()
+        return entry
+
+    def get(self, park_data, visit_day: str, start_minute: float = OPENING_MINUTE) -> RouteCostModel:
+        """The cost model for ``park_data`` on ``visit_day``, built at most once."""
+        entry = self.park_entry(park_data)
+        cost_model = entry.cost_model(visit_day, start_minute)
+        self._evict()
+        return cost_model
+
+    def neighbor_index(self, park_data) -> NeighborIndex:
+        return self.park_entry(park_data).neighbor_index
+
+    def _evict(self):
+        # Never evict the entry that was just used
+        while len(self.entries) > 1 and (
+                len(self.entries) > self.max_parks or (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
@@ -1,10 +1,15 @@
 import random
 from typing import List
 
+import numpy as np
+
+from anytime import Deadline, Incumbent
+from cost import RouteCostModel
+
 
 class GeneticAlgorithm:
     def __init__(self, ride_durations, travel_times, ride_categories, category_delays, day_category_effects,
-                 desired_rides, day, time_limit):
+                 desired_rides, day, time_limit, cost_model=None):
         self.ride_durations = ride_durations
         self.travel_times = travel_times
         self.ride_categories = ride_categories
@@ -17,63 +22,72 @@ class GeneticAlgorithm:
         self.population_size = 80
         self.generations = 30
         self.mutation_rate = 0.05
+        # Routes to seed part of the initial population with, e.g. a greedy or cached route
+        self.initial_solutions: List[List[int]] = []
+        self.seed_fraction = 0.25
         self.path = []
         self.total_time = 0
+        # Called as observer(event, **values) with convergence events, see instrument.Profile
+        self.observer = None
+        if cost_model is None:
+            cost_model = RouteCostModel(ride_durations, travel_times, ride_categories, category_delays, day,
+                                        day_category_effects)
+        self.cost_model = cost_model
 
     def is_feasible(self, chromosome):
         if not chromosome:
             return True
-        total_time = self.travel_times[0][chromosome[0]]
-        for i in range(len(chromosome) - 1):
-            ride = chromosome[i]
-            next_ride = chromosome[i + 1]
-            total_time += self.ride_durations[ride] + self.travel_times[ride][next_ride] + self.get_penalty(ride)
-            if total_time > self.time_limit:
-                return False
-        if total_time + self.ride_durations[chromosome[-1]] + self.get_penalty(chromosome[-1]) + self.get_penalty(
-                chromosome[-1]) > self.time_limit:
-            return False
-        return True
+        return self.cost_model.route_time(chromosome) <= self.time_limit
 
     def get_penalty(self, ride):
-        penalties = 0
-        categories = [self.ride_categories[ride]]
-        for category in categories:
-            if category in self.day_category_effects[self.day]:
-                percentage_delay = self.category_delays.get(category, 0)  # Get the percentage delay
-                penalties += (percentage_delay / 100) * self.ride_durations[ride]
-        return penalties
+        return self.cost_model.penalty_list[ride]
+
+    def repair(self, chromosome):
+        """Longest prefix of ``chromosome`` that fits in the time limit, found in one pass."""
+        return chromosome[:self.fitness_function(chromosome)]
 
     def generate_chromosome(self):
         chromosome = self.desired_rides.copy()
         random.shuffle(chromosome)
-        while chromosome and not self.is_feasible(chromosome):
-            chromosome.pop()
-        return chromosome
+        return self.repair(chromosome)
+
+    def seeded_chromosome(self, seed):
+        """``seed`` followed by the other desired rides in random order, repaired."""
+        in_seed = set(seed)
+        rest = [ride for ride in self.desired_rides if ride not in in_seed]
+        random.shuffle(rest)
+        return self.repair(list(seed) + rest)
 
-    def generate_population(self, size):
+    def generate_population(self, size, deadline=None):
         population = []
+        if self.initial_solutions:
+            for index in range(int(size * self.seed_fraction)):
+                population.append(self.seeded_chromosome(self.initial_solutions[index % len(self.initial_solutions)]))
         while len(population) < size:
-            chromosome = self.generate_chromosome()
-            if self.is_feasible(chromosome):
-                population.append(chromosome)
+            if population and deadline is not None and deadline.expired():
+                break
+            # Repaired chromosomes always fit, so none is rejected
+            population.append(self.generate_chromosome())
         return population
 
     def fitness_function(self, chromosome):
-        total_time = 0
-        rides_visited = 0
+        """Number of leading rides of the chromosome that finish within the time limit."""
         if not chromosome:
             return 0
-        for i in range(len(chromosome) - 1):
-            ride = chromosome[i]
-            next_ride = chromosome[i + 1]
-            total_time += self.ride_durations[ride] + self.travel_times[ride][next_ride] + self.get_penalty(ride)
-            if total_time > self.time_limit:
-                return rides_visited
-            rides_visited += 1
-        if total_time + self.ride_durations[chromosome[-1]] + self.get_penalty(chromosome[-1]) <= self.time_limit:
-            rides_visited += 1
-        return rides_visited
+        arrivals = self.cost_model.arrival_times(chromosome)
+        return int(np.searchsorted(arrivals, self.time_limit, side='right'))
+
+    def population_fitness(self, population):
+        """Score the whole population in one batched pass over the cost model."""
+        if not population:
+            return []
+        lengths = np.array([len(chromosome) for chromosome in population])
+        routes = np.zeros((len(population), max(lengths.max(), 1)), dtype=np.intp)
+        for row, chromosome in enumerate(population):
+            routes[row, :len(chromosome)] = chromosome
+        arrivals = self.cost_model.route_times(routes, lengths)
+        in_time = (arrivals <= self.time_limit) & (np.arange(routes.shape[1]) < lengths[:, None])
+        return in_time.sum(axis=1).tolist()
 
     def selection(self, population, fitnesses):
         total_fitness = sum(fitnesses)
@@ -106,26 +120,34 @@ class GeneticAlgorithm:
             return None
         return chromosome
 
-    def calculate_total_time(self, path: List[int]) -> int:
-        total_time = 0
-        current_ride = 0  # Start from ride 0
-        for ride in path:
-            # Calculate the delay for the ride
-            delay = self.get_penalty(ride)
-            # Add travel time and ride duration with delay
-            total_time += self.travel_times[current_ride][ride] + self.ride_durations[ride] + delay
-            current_ride = ride
-        return total_time
+    def calculate_total_time(self, path: List[int]) -> float:
+        return self.cost_model.route_time(path)
+
+    def offer_best(self, incumbent, population, fitnesses):
+        best_chromosome = max(zip(population, fitnesses), key=lambda x: x[1])[0]
+        incumbent.offer(best_chromosome, self.calculate_total_time(best_chromosome))
 
-    def run(self):
-        population = self.generate_population(self.population_size)
+    def run(self, time_budget=None, on_improvement=None):
+        """Evolve the population; ``time_budget`` (seconds) stops between generations.
+
+        Each new best chromosome is reported to ``on_improvement(path, num_rides, total_time)``.
+        """
+        deadline = Deadline(time_budget)
+        incumbent = Incumbent(on_improvement)
+        population = self.generate_population(self.population_size, deadline)
 
         for generation in range(self.generations):
-            fitnesses = [self.fitness_function(chromosome) for chromosome in population]
+            fitnesses = self.population_fitness(population)
+            self.offer_best(incumbent, population, fitnesses)
+            if self.observer is not None:
+                self.observer('generation', generation=generation, best_fitness=max(fitnesses),
+                              mean_fitness=sum(fitnesses) / len(fitnesses), population=len(population))
+            if deadline.expired():
+                break
             new_population = []
             sorted_population = sorted(zip(population, fitnesses), key=lambda x: x[1], reverse=True)
             new_population.append(sorted_population[0][0])
-            while len(new_population) < self.population_size:
+            while len(new_population) < self.population_size and not deadline.expired():
                 parent1 = self.selection(population, fitnesses)
                 parent2 = self.selection(population, fitnesses)
                 child = self.crossover(parent1, parent2)
@@ -135,10 +157,16 @@ class GeneticAlgorithm:
                         new_population.append(mutated_child)
                     else:
                         new_population.append(child)
+            if len(new_population) < self.population_size:
+                # Out of time mid-generation; the last full population is already offered
+                break
             population = new_population
-        best_solution = max(zip(population, fitnesses), key=lambda x: x[1])
-        total_time = self.calculate_total_time(best_solution[0])
-        self.path = best_solution[0]
+        else:
+            self.offer_best(incumbent, population, self.population_fitness(population))
+
+        best_solution = incumbent.path
+        total_time = self.calculate_total_time(best_solution)
+        self.path = best_solution
         self.total_time = total_time
 
-        return len(best_solution[0]), total_time
+        return len(best_solution), total_time
@@ -0,0 +1,161 @@
+"""Bulk synthetic parks and users for load tests.
+
+Every park draws from its own generator, spawned from one ``SeedSequence``, so park ``i``
+is the same however many parks are generated and whatever order they are made in. A
+park's arrays are drawn in a few vectorized calls. Layouts:
+
+- ``uniform``: independent walking times, distributed like ``ParkData``'s
+- ``metric``: straight-line distances between rides scattered over a square
+- ``clustered``: the same, with rides grouped around a few centres
+
+A corpus on disk is a directory of ``parkio`` park files and an ``index.json`` with the
+users; :func:`iter_corpus` streams it back one memory-mapped park at a time::
+
+    python corpus.py corpus_dir --parks 5000 --layout clustered
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from parkio import load_park, save_park
+from util import CATEGORIES, DAYS, CategoryCodes, ParkData, UserData
+
+LAYOUTS = ('uniform', 'metric', 'clustered')
+INDEX_FILE = 'index.json'
+FORMAT_VERSION = 1
+
+# Side of the square metric layouts are drawn on, giving a mean walk of about 9 minutes
+# like the uniform layout's 3 to 15
+LAYOUT_SIDE = 17.5
+# Rides per cluster centre, and the spread of a cluster as a fraction of the side
+RIDES_PER_CLUSTER = 8
+CLUSTER_SPREAD = 0.08
+
+
+def travel_matrix(num_rides: int, rng: np.random.Generator, layout: str = 'uniform') -> np.ndarray:
+    """Walking minutes between rides as a uint16 matrix with a zero diagonal."""
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout}")
+    if layout == 'uniform':
+        travel = rng.integers(3, 16, size=(num_rides, num_rides), dtype=np.uint16)
+    else:
+        if layout == 'metric':
+            positions = rng.random((num_rides, 2)) * LAYOUT_SIDE
+        else:
+            num_clusters = max(1, num_rides // RIDES_PER_CLUSTER)
+            centres = rng.random((num_clusters, 2)) * LAYOUT_SIDE
+            positions = centres[rng.integers(num_clusters, size=num_rides)]
+            positions = positions + rng.normal(0.0, CLUSTER_SPREAD * LAYOUT_SIDE, size=(num_rides, 2))
+        distances = np.hypot(*(positions[:, None, :] - positions[None, :, :]).transpose(2, 0, 1))
+        # At least a minute between distinct rides
+        travel = np.maximum(np.rint(distances), 1).astype(np.uint16)
+    np.fill_diagonal(travel, 0)
+    return travel
+
+
+def synthetic_park(park_name: str, num_rides: int, rng: np.random.Generator, layout: str = 'uniform') -> ParkData:
+    """Compact random park, distributed like ``ParkData(park_name, num_rides)`` apart from the layout."""
+    ride_times = rng.integers(3, 21, size=num_rides, dtype=np.uint16)
+    travel_times = travel_matrix(num_rides, rng, layout)
+    ride_categories = CategoryCodes(rng.integers(len(CATEGORIES), size=num_rides, dtype=np.uint8), CATEGORIES)
+    family, thrill, adventure = rng.integers([1, 3, 5], [21, 26, 46]).tolist()
+    category_time_addition = {
+        'Family': family,
+        'Thrill': thrill,
+        'Adventure': adventure,
+        'Adults': 20,
+        'Food': 40,
+        'No Shelter': 60,
+        'Maintenance': 80
+    }
+    day_category_affect = dict(zip(DAYS, (CATEGORIES[code] for code in
+                                          rng.integers(len(CATEGORIES), size=len(DAYS)).tolist())))
+    return ParkData.from_components(park_name, ride_times, travel_times, ride_categories, category_time_addition,
+                                    day_category_affect)
+
+
+def synthetic_user(num_rides: int, rng: np.random.Generator) -> UserData:
+    """Random user, distributed like ``UserData(num_rides)``."""
+    num_desired = int(rng.integers(1, num_rides + 1))
+    desired_rides = rng.choice(num_rides, size=num_desired, replace=False).tolist()
+    return UserData(num_rides, desired_rides, int(rng.integers(10, 51)), DAYS[int(rng.integers(len(DAYS)))])
+
+
+def synthetic_corpus(num_parks: int, min_rides: int = 10, max_rides: int = 40, layout: str = 'uniform',
+                     seed: int = 0) -> Iterator[Tuple[ParkData, UserData]]:
+    """(park, user) pairs named ``'0'``, ``'1'``, ..., generated lazily, one stream per park."""
+    for park_index, park_seed in enumerate(np.random.SeedSequence(seed).spawn(num_parks)):
+        rng = np.random.default_rng(park_seed)
+        num_rides = int(rng.integers(min_rides, max_rides + 1))
+        park_data = synthetic_park(str(park_index), num_rides, rng, layout)
+        yield park_data, synthetic_user(num_rides, rng)
+
+
+def write_corpus(directory: str, num_parks: int, min_rides: int = 10, max_rides: int = 40, layout: str = 'uniform',
+                 seed: int = 0):
+    """Generate a corpus straight to ``directory``, holding one park in memory at a time."""
+    os.makedirs(directory, exist_ok=True)
+    entries = []
+    for park_data, user_data in synthetic_corpus(num_parks, min_rides, max_rides, layout, seed):
+        file_name = f"park_{park_data.park_name}.park"
+        save_park(park_data, os.path.join(directory, file_name))
+        entries.append({
+            'park_name': park_data.park_name,
+            'file': file_name,
+            'desired_rides': user_data.desired_rides,
+            'total_time_available': user_data.total_time_available,
+            'visit_day': user_data.visit_day,
+        })
+    index = {'version': FORMAT_VERSION, 'layout': layout, 'seed': seed, 'parks': entries}
+    temporary = os.path.join(directory, f"{INDEX_FILE}.tmp")
+    with open(temporary, 'w') as f:
+        json.dump(index, f)
+    # The index is written last, so a corpus with an index is always complete
+    os.replace(temporary, os.path.join(directory, INDEX_FILE))
+
+
+def read_index(directory: str) -> dict:
+    with open(os.path.join(directory, INDEX_FILE)) as f:
+        index = json.load(f)
+    if index.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported corpus version {index.get('version')} in {directory}.")
+    return index
+
+
+def corpus_park_names(directory: str) -> List[str]:
+    return [entry['park_name'] for entry in read_index(directory)['parks']]
+
+
+def iter_corpus(directory: str, mmap: bool = True) -> Iterator[Tuple[ParkData, UserData]]:
+    """Stream the (park, user) pairs of a corpus written by :func:`write_corpus`.
+
+    Parks are loaded as they are reached, memory-mapped unless ``mmap`` is false, so the
+    corpus can be fed to ``main.run_simulations`` or ``runner.run_simulations_parallel``
+    together with :func:`corpus_park_names`.
+    """
+    for entry in read_index(directory)['parks']:
+        park_data = load_park(os.path.join(directory, entry['file']), mmap=mmap)
+        user_data = UserData(park_data.num_rides, entry['desired_rides'], entry['total_time_available'],
+                             entry['visit_day'])
+        yield park_data, user_data
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory')
+    parser.add_argument('--parks', type=int, default=1000)
+    parser.add_argument('--min-rides', type=int, default=10)
+    parser.add_argument('--max-rides', type=int, default=40)
+    parser.add_argument('--layout', choices=LAYOUTS, default='uniform')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    write_corpus(args.directory, args.parks, args.min_rides, args.max_rides, args.layout, args.seed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+import copy
+from typing import List, Dict, Sequence
+
+import numpy as np
+
+from util import OPENING_MINUTE, CategoryCodes
+
+
+def as_travel_matrix(travel_times) -> np.ndarray:
+    """Travel times as an array; arrays (including read-only memory maps) are used as-is, without a copy."""
+    if isinstance(travel_times, np.ndarray):
+        return travel_times
+    return np.asarray(travel_times, dtype=np.float64)
+
+
+class RouteCostModel:
+    """Precompiled route costs for one park on one visit day.
+
+    The day's category delay is folded into ``durations`` once, so scoring a
+    route is a handful of array lookups instead of per-ride dict and string work.
+
+    With a ``queue_model`` each ride also costs the queue wait at the minute it is
+    reached, the visit starting at clock minute ``start_minute``. Route times then
+    depend on the order of every earlier ride, so they are accumulated leg by leg.
+
+    Routes start from ``start_ride``, the entrance (ride 0) unless the model was
+    :meth:`resumed` part way through a visit.
+    """
+
+    def __init__(
+            self,
+            ride_durations: List[int],
+            travel_times: List[List[int]],
+            ride_categories: List[str],
+            category_delays: Dict[str, int],
+            day: str,
+            day_category_effects: Dict[str, str],
+            travel_list: List[List[float]] = None,
+            queue_model=None,
+            start_minute: float = OPENING_MINUTE,
+            start_ride: int = 0,
+            wait_rows: Dict[int, List[float]] = None,
+    ):
+        self.day = day
+        self.travel = as_travel_matrix(travel_times)
+        base_durations = np.asarray(ride_durations, dtype=np.float64)
+
+        affected_category = day_category_effects.get(day)
+        if isinstance(ride_categories, CategoryCodes):
+            affected = ride_categories.codes == ride_categories.code(affected_category)
+        else:
+            affected = np.array([category == affected_category for category in ride_categories], dtype=bool)
+        percentage_delay = category_delays.get(affected_category, 0) if affected_category is not None else 0
+        self.penalties = np.where(affected, (percentage_delay / 100) * base_durations, 0.0)
+        self.durations = base_durations + self.penalties
+        self.num_rides = len(self.durations)
+
+        # Plain-list mirrors for the scalar loops, where indexing lists beats numpy scalars.
+        # The travel mirror is built on first use, as it costs a Python object per matrix entry.
+        # Models of the same park on other days can share one via ``travel_list``; an empty
+        # list passed there is filled in place by whichever model needs it first.
+        self._travel_list: List[List[float]] = travel_list
+        self.duration_list: List[float] = self.durations.tolist()
+        self.penalty_list: List[float] = self.penalties.tolist()
+
+        self.queue_model = queue_model
+        self.start_minute = start_minute
+        self.start_ride = start_ride
+        # Wait rows as lists, built per ride on first use by the scalar loops; models of
+        # the same park can share them via ``wait_rows``, as they don't depend on the day
+        self._wait_rows: Dict[int, List[float]] = {} if wait_rows is None else wait_rows
+
+    @property
+    def time_dependent(self) -> bool:
+        return self.queue_model is not None
+
+    @property
+    def travel_list(self) -> List[List[float]]:
+        if self._travel_list is None:
+            self._travel_list = self.travel.tolist()
+        elif len(self._travel_list) < self.num_rides:
+            self._travel_list.extend(self.travel.tolist())
+        return self._travel_list
+
+    @classmethod
+    def from_data(cls, park_data, user_data) -> "RouteCostModel":
+        return cls(
+            park_data.ride_times,
+            park_data.travel_times,
+            park_data.ride_categories,
+            park_data.category_time_addition,
+            user_data.visit_day,
+            park_data.day_category_affect,
+            queue_model=park_data.queue_model,
+            start_minute=user_data.start_minute,
+        )
+
+    def starting_at(self, start_minute: float) -> "RouteCostModel":
+        """This model for a visit starting at clock minute ``start_minute``, sharing the arrays and list mirrors."""
+        model = copy.copy(self)
+        model.start_minute = start_minute
+        return model
+
+    def resumed(self, start_ride: int, elapsed: float) -> "RouteCostModel":
+        """This model for the rest of a visit: routes start at ``start_ride``, ``elapsed`` minutes in.
+
+        Route times are then counted from that moment. The arrays and list mirrors are shared.
+        """
+        model = self.starting_at(self.start_minute + elapsed)
+        model.start_ride = start_ride
+        return model
+
+    def wait(self, ride: int, time: float) -> float:
+        """Queue wait at ``ride`` when reaching it ``time`` minutes into the visit."""
+        if self.queue_model is None:
+            return 0.0
+        row = self._wait_rows.get(ride) or self._wait_row(ride)
+        return row[min(max(int(self.start_minute + time), 0), len(row) - 1)]
+
+    def _wait_row(self, ride: int) -> List[float]:
+        row = self._wait_rows[ride] = self.queue_model.table[ride].tolist()
+        return row
+
+    def waits(self, rides, times) -> np.ndarray:
+        """Vectorized :meth:`wait` for arrays of rides and arrival times."""
+        if self.queue_model is None:
+            return np.zeros(np.broadcast(rides, times).shape)
+        return self.queue_model.waits(rides, self.start_minute + np.asarray(times))
+
+    def leg_time(self, current_ride: int, next_ride: int, time: float = 0.0) -> float:
+        """Travel to ``next_ride`` plus its effective duration, leaving ``current_ride`` at ``time``."""
+        travel_time = self.travel_list[current_ride][next_ride]
+        if self.queue_model is None:
+            return travel_time + self.duration_list[next_ride]
+        return travel_time + self.wait(next_ride, time + travel_time) + self.duration_list[next_ride]
+
+    def continued_time(self, previous_ride: int, time: float, rides: Sequence[int]) -> float:
+        """Finish time of ``rides`` taken in order after leaving ``previous_ride`` at ``time``."""
+        travel = self.travel_list
+        durations = self.duration_list
+        if self.queue_model is None:
+            for ride in rides:
+                time += travel[previous_ride][ride] + durations[ride]
+                previous_ride = ride
+            return time
+        for time in self._timed_finishes(previous_ride, time, rides):
+            pass
+        return time
+
+    def min_ride_costs(self, rides: Sequence[int]) -> np.ndarray:
+        """Least time any route over the distinct ``rides`` spends on each of them.
+
+        That is the ride's duration (and least queue wait) plus its cheapest inbound walk,
+        from the start or another of ``rides``.
+        """
+        rides = np.asarray(rides, dtype=np.intp)
+        sources = np.concatenate(([self.start_ride], rides))
+        inbound = self.travel[np.ix_(sources, rides)].astype(np.float64)
+        # A ride never follows itself
+        inbound[np.arange(1, len(sources)), np.arange(len(rides))] = np.inf
+        costs = inbound.min(axis=0) + self.durations[rides]
+        if self.queue_model is not None:
+            costs += self.queue_model.min_waits[rides]
+        return costs
+
+    def ride_count_bound(self, rides: Sequence[int], time_limit: float) -> int:
+        """Upper bound on how many of ``rides`` a single route can fit within ``time_limit``.
+
+        Every ride costs at least its :meth:`min_ride_costs` entry, so the cheapest such
+        costs bound any route.
+        """
+        rides = np.unique(np.asarray(rides, dtype=np.intp))
+        if rides.size == 0:
+            return 0
+        cheapest = np.sort(self.min_ride_costs(rides))
+        # Small slack so float round-off never makes the bound inadmissible
+        return int(np.searchsorted(np.cumsum(cheapest), time_limit + 1e-9, side='right'))
+
+    def route_time(self, route: Sequence[int]) -> float:
+        if self.queue_model is not None:
+            arrivals = self._timed_arrivals(route)
+            return arrivals[-1] if arrivals else 0.0
+        if not self._travel_list:
+            # Don't build the list mirror just to score a route; the array sum is equivalent
+            arrivals = self.arrival_times(route)
+            return float(arrivals[-1]) if len(arrivals) else 0.0
+        total_time = 0.0
+        travel = self._travel_list
+        durations = self.duration_list
+        current_ride = self.start_ride
+        for ride in route:
+            total_time += travel[current_ride][ride] + durations[ride]
+            current_ride = ride
+        return total_time
+
+    def arrival_times(self, route: Sequence[int]) -> np.ndarray:
+        """Cumulative finish time after each ride of ``route``."""
+        if self.queue_model is not None:
+            return np.array(self._timed_arrivals(route), dtype=np.float64)
+        route = np.asarray(route, dtype=np.intp)
+        if route.size == 0:
+            return np.zeros(0)
+        previous = np.concatenate(([self.start_ride], route[:-1]))
+        return np.cumsum(self.travel[previous, route] + self.durations[route])
+
+    def route_times(self, routes: np.ndarray, lengths: np.ndarray = None) -> np.ndarray:
+        """Score many routes at once.
+
+        ``routes`` is a 2-D integer array of padded routes; only the first
+        ``lengths[i]`` entries of row ``i`` count (the whole row if omitted).
+        Returns the cumulative finish times, one row per route; entries past a
+        route's length repeat its total so ``[:, -1]`` is always the route time.
+        """
+        routes = np.asarray(routes, dtype=np.intp)
+        if routes.ndim != 2:
+            raise ValueError("routes must be a 2-D array.")
+        num_routes, width = routes.shape
+        if width == 0:
+            return np.zeros((num_routes, 0))
+        previous = np.empty_like(routes)
+        previous[:, 0] = self.start_ride
+        previous[:, 1:] = routes[:, :-1]
+        if self.queue_model is not None:
+            return self._timed_route_times(routes, previous, lengths)
+        legs = self.travel[previous, routes] + self.durations[routes]
+        if lengths is not None:
+            legs[np.arange(width) >= np.asarray(lengths)[:, None]] = 0.0
+        return np.cumsum(legs, axis=1)
+
+    def total_times(self, routes: np.ndarray, lengths: np.ndarray = None) -> np.ndarray:
+        """Total time of each padded route, see :meth:`route_times`."""
+        cumulative = self.route_times(routes, lengths)
+        if cumulative.shape[1] == 0:
+            return np.zeros(cumulative.shape[0])
+        return cumulative[:, -1]
+
+    def _timed_arrivals(self, route: Sequence[int]) -> List[float]:
+        return list(self._timed_finishes(self.start_ride, 0.0, route))
+
+    def _timed_finishes(self, previous_ride: int, time: float, rides: Sequence[int]):
+        # wait() inlined, as this loop prices every move of the local searches on parks with queues
+        travel = self.travel_list
+        durations = self.duration_list
+        rows = self._wait_rows
+        start_minute = self.start_minute
+        last = self.queue_model.horizon - 1
+        for ride in rides:
+            time += travel[previous_ride][ride]
+            minute = int(start_minute + time)
+            time += (rows.get(ride) or self._wait_row(ride))[minute if 0 <= minute < last else max(min(minute, last), 0)]
+            time += durations[ride]
+            yield time
+            previous_ride = ride
+
+    def _timed_route_times(self, routes: np.ndarray, previous: np.ndarray, lengths: np.ndarray = None) -> np.ndarray:
+        # Each leg's wait depends on the time it is reached, so step through the positions,
+        # still scoring every route at once
+        num_routes, width = routes.shape
+        cumulative = np.empty((num_routes, width))
+        finish = np.zeros(num_routes)
+        for position in range(width):
+            rides = routes[:, position]
+            reached = finish + self.travel[previous[:, position], rides]
+            step = reached + self.waits(rides, reached) + self.durations[rides]
+            if lengths is not None:
+                step = np.where(position < np.asarray(lengths), step, finish)
+            cumulative[:, position] = finish = step
+        return cumulative
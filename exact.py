@@ -0,0 +1,155 @@
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+from cost import RouteCostModel
+
+
+class ExactDPOptimizer:
+    """Held-Karp style bitmask DP that solves the max-rides/min-time problem exactly.
+
+    The table holds the earliest finish time of every (visited set, last ride) state.
+    It is filled one layer of visited-set size at a time, so only two layers of times
+    are alive at once; each layer also keeps a uint8 table of predecessor rides, which
+    is all that is needed to rebuild the best route. A layer only holds the sets that
+    extend a reachable set of the layer before, and the DP stops at the first layer with
+    none.
+
+    Time-dependent queue waits are looked up from each state's arrival time. Keeping only
+    the earliest finish per state stays exact as long as the waits are FIFO (see
+    ``QueueModel.is_fifo``); other queue models are refused.
+    """
+
+    def __init__(
+            self,
+            desired_rides: List[int],
+            time_limit: int,
+            ride_durations: List[int],
+            travel_times: List[List[int]],
+            ride_categories: List[str],
+            category_delays: Dict[str, int],
+            day: str,
+            day_category_effects: Dict[str, str],
+            cost_model: RouteCostModel = None,
+    ):
+        self.desired_rides = desired_rides
+        self.time_limit = time_limit
+        self.ride_durations = ride_durations
+        self.travel_times = travel_times
+        self.ride_categories = ride_categories
+        self.category_delays = category_delays
+        self.day = day
+        self.day_category_effects = day_category_effects
+        self.max_rides = 22
+        self.path = []
+        self.total_time = 0
+        self.states_explored = 0
+        # Called as observer(event, **values) with convergence events, see instrument.Profile
+        self.observer = None
+        if cost_model is None:
+            cost_model = RouteCostModel(ride_durations, travel_times, ride_categories, category_delays, day,
+                                        day_category_effects)
+        self.cost_model = cost_model
+
+    @staticmethod
+    def _next_layer(masks: np.ndarray, num_rides: int) -> np.ndarray:
+        """Sorted visited sets one ride larger than a set in ``masks``."""
+        # A flag per possible set dedupes and sorts in one pass; it lives only for this layer
+        grown = np.zeros(1 << num_rides, dtype=bool)
+        for ride in range(num_rides):
+            grown[masks[(masks >> ride) & 1 == 0] | (1 << ride)] = True
+        return np.flatnonzero(grown)
+
+    def solve(self) -> List[int]:
+        rides = list(dict.fromkeys(self.desired_rides))
+        num_rides = len(rides)
+        if num_rides > self.max_rides:
+            raise ValueError(f"Exact solver supports at most {self.max_rides} desired rides, got {num_rides}.")
+        if self.cost_model.time_dependent and not self.cost_model.queue_model.is_fifo():
+            raise ValueError("Exact solver needs FIFO queue waits, where arriving later never means finishing earlier.")
+        if num_rides == 0:
+            return []
+
+        index = np.asarray(rides, dtype=np.intp)
+        durations = self.cost_model.durations[index]
+        travel = self.cost_model.travel[np.ix_(index, index)]
+        time_dependent = self.cost_model.time_dependent
+        first_legs = self.cost_model.travel[self.cost_model.start_ride, index]
+        first_legs = first_legs + self.cost_model.waits(index, first_legs) + durations
+        legs = travel + durations[None, :]
+
+        # Layer 1: a single ride straight from the start (the entrance, ride 0, on a fresh visit)
+        times = np.full((num_rides, num_rides), np.inf)
+        times[np.arange(num_rides), np.arange(num_rides)] = first_legs
+        times[times > self.time_limit] = np.inf
+        kept = np.isfinite(times).any(axis=1)
+        if not kept.any():
+            return []
+        masks = (np.int64(1) << np.arange(num_rides, dtype=np.int64))[kept]
+        times = times[kept]
+        # Each layer's reachable sets, in ascending order, and their predecessor rides
+        layers = [masks]
+        parents = [np.zeros(times.shape, dtype=np.uint8)]
+        self.states_explored = int(np.isfinite(times).sum())
+
+        for size in range(2, num_rides + 1):
+            # Position of each set of the last layer, -1 for sets it didn't reach
+            positions = np.full(1 << num_rides, -1, dtype=np.int32)
+            positions[masks] = np.arange(len(masks), dtype=np.int32)
+            next_masks = self._next_layer(masks, num_rides)
+            next_times = np.full((len(next_masks), num_rides), np.inf)
+            next_parents = np.zeros(next_times.shape, dtype=np.uint8)
+            for ride in range(num_rides):
+                has_ride = np.nonzero((next_masks >> ride) & 1)[0]
+                found = positions[next_masks[has_ride] ^ (1 << ride)]
+                reached_before = found >= 0
+                has_ride = has_ride[reached_before]
+                if not len(has_ride):
+                    continue
+                previous = times[found[reached_before]]
+                if time_dependent:
+                    reached = previous + travel[:, ride]
+                    previous = reached + self.cost_model.waits(index[ride], reached) + durations[ride]
+                else:
+                    previous = previous + legs[:, ride]
+                best = np.argmin(previous, axis=1)
+                next_times[has_ride, ride] = previous[np.arange(len(has_ride)), best]
+                next_parents[has_ride, ride] = best
+            next_times[next_times > self.time_limit] = np.inf
+            kept = np.isfinite(next_times).any(axis=1)
+            if not kept.any():
+                break
+            reachable = int(np.isfinite(next_times).sum())
+            self.states_explored += reachable
+            if self.observer is not None:
+                self.observer('layer', rides=size, states=reachable)
+            if kept.all():
+                masks, times = next_masks, next_times
+            else:
+                masks, times, next_parents = next_masks[kept], next_times[kept], next_parents[kept]
+            layers.append(masks)
+            parents.append(next_parents)
+
+        # The deepest reachable layer has the most rides; its fastest state is the optimum
+        size = len(parents)
+        state, last = np.unravel_index(np.argmin(times), times.shape)
+        mask = int(layers[size - 1][state])
+        path = []
+        while True:
+            path.append(rides[last])
+            position = int(np.searchsorted(layers[size - 1], mask))
+            parent = int(parents[size - 1][position, last])
+            mask ^= 1 << last
+            size -= 1
+            if not size:
+                break
+            last = parent
+        path.reverse()
+        return path
+
+    def run(self) -> Tuple[int, float]:
+        best_solution = self.solve()
+        total_time = self.cost_model.route_time(best_solution)
+        self.path = best_solution
+        self.total_time = total_time
+        return len(best_solution), total_time
@@ -0,0 +1,142 @@
+"""Walkway graph travel model.
+
+A park is a graph of rides and junctions joined by walkways. Travel times between rides
+are shortest-path distances on that graph, so unlike the independently drawn matrix in
+``ParkData`` they satisfy the triangle inequality. ``WalkwayGraph.ride_travel_times``
+produces the dense ride-to-ride matrix every optimizer already consumes.
+"""
+import heapq
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# Graphs up to this many nodes use vectorized Floyd-Warshall, larger ones Dijkstra per ride
+FLOYD_WARSHALL_MAX_NODES = 400
+
+
+class WalkwayGraph:
+    """Undirected weighted graph; nodes ``0..num_rides-1`` are rides, the rest junctions.
+
+    Edges are stored in CSR form (``indptr``, ``indices``, ``weights``), so memory grows
+    with the number of walkways rather than with the square of the number of nodes.
+    """
+
+    def __init__(self, num_rides: int, num_nodes: int, edges: Sequence[Tuple[int, int, float]]):
+        if num_nodes < num_rides:
+            raise ValueError("A walkway graph needs a node for every ride.")
+        self.num_rides = num_rides
+        self.num_nodes = num_nodes
+
+        edges = np.asarray(edges, dtype=np.float64).reshape(-1, 3)
+        ends = edges[:, :2].astype(np.intp)
+        if len(ends) and (ends.min() < 0 or ends.max() >= num_nodes):
+            raise ValueError("Walkway endpoint out of range.")
+        if (edges[:, 2] < 0).any():
+            raise ValueError("Walkway lengths must be non-negative.")
+        # Both directions of every walkway, grouped by source node
+        sources = np.concatenate((ends[:, 0], ends[:, 1]))
+        targets = np.concatenate((ends[:, 1], ends[:, 0]))
+        weights = np.concatenate((edges[:, 2], edges[:, 2]))
+        order = np.argsort(sources, kind='stable')
+        self.indices = targets[order]
+        self.weights = weights[order]
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=num_nodes))))
+        self._adjacency_lists: Tuple[List[int], List[int], List[float]] = None
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices) // 2
+
+    @classmethod
+    def random(cls, num_rides: int, num_junctions: int = None, degree: int = 3,
+               rng: np.random.Generator = None) -> "WalkwayGraph":
+        """Random connected park layout.
+
+        Nodes are scattered over a square and each is joined to its ``degree`` nearest
+        neighbours and to the nearest node placed before it, which keeps the graph connected.
+        Walkway lengths are rounded straight-line distances of at least one minute.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        num_junctions = num_rides // 2 if num_junctions is None else num_junctions
+        num_nodes = num_rides + num_junctions
+        positions = rng.random((num_nodes, 2)) * 2.5 * np.sqrt(num_nodes)
+
+        edges = set()
+        block = 1024
+        for start in range(0, num_nodes, block):
+            stop = min(start + block, num_nodes)
+            distances = np.linalg.norm(positions[start:stop, None, :] - positions[None, :, :], axis=2)
+            rows = np.arange(stop - start)
+            distances[rows, rows + start] = np.inf
+            num_neighbors = min(degree, num_nodes - 1)
+            if num_neighbors > 0:
+                nearest = np.argpartition(distances, num_neighbors - 1, axis=1)[:, :num_neighbors]
+                edges.update((min(i, j), max(i, j)) for i, row in zip(range(start, stop), nearest.tolist())
+                             for j in row)
+            # Nearest earlier node, so node i is reachable from node 0
+            earlier = np.where(np.arange(num_nodes) < rows[:, None] + start, distances, np.inf)
+            parents = np.argmin(earlier, axis=1)
+            edges.update((int(parent), i) for i, parent in zip(range(start, stop), parents.tolist()) if i > 0)
+
+        edges = sorted(edges)
+        ends = np.array(edges, dtype=np.intp).reshape(-1, 2)
+        lengths = np.maximum(1, np.rint(np.linalg.norm(positions[ends[:, 0]] - positions[ends[:, 1]], axis=1)))
+        return cls(num_rides, num_nodes, np.column_stack((ends, lengths)))
+
+    def dijkstra(self, source: int) -> np.ndarray:
+        """Shortest distance from ``source`` to every node (``inf`` if unreachable)."""
+        indptr, indices, weights = self._adjacency()
+        distances = [float('inf')] * self.num_nodes
+        distances[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if distance > distances[node]:
+                continue
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[edge]
+                candidate = distance + weights[edge]
+                if candidate < distances[neighbor]:
+                    distances[neighbor] = candidate
+                    heapq.heappush(heap, (candidate, neighbor))
+        return np.array(distances)
+
+    def floyd_warshall(self) -> np.ndarray:
+        """All-pairs shortest distances between every pair of nodes, one vectorized pass per node."""
+        distances = np.full((self.num_nodes, self.num_nodes), np.inf)
+        sources = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+        np.minimum.at(distances, (sources, self.indices), self.weights)
+        np.fill_diagonal(distances, 0.0)
+        for via in range(self.num_nodes):
+            np.minimum(distances, distances[:, via, None] + distances[None, via, :], out=distances)
+        return distances
+
+    def ride_travel_times(self, method: str = 'auto') -> np.ndarray:
+        """Ride-to-ride shortest walking times as a dense ``num_rides`` square matrix.
+
+        ``method`` is ``'floyd_warshall'``, ``'dijkstra'`` or ``'auto'``, which picks
+        Floyd-Warshall for small graphs. Integer walkway lengths give an integer matrix.
+        """
+        if method == 'auto':
+            method = 'floyd_warshall' if self.num_nodes <= FLOYD_WARSHALL_MAX_NODES else 'dijkstra'
+        if method == 'floyd_warshall':
+            travel = self.floyd_warshall()[:self.num_rides, :self.num_rides]
+        elif method == 'dijkstra':
+            travel = np.empty((self.num_rides, self.num_rides))
+            for ride in range(self.num_rides):
+                travel[ride] = self.dijkstra(ride)[:self.num_rides]
+        else:
+            raise ValueError(f"Unknown shortest-path method: {method}")
+
+        if np.isinf(travel).any():
+            ride = int(np.nonzero(np.isinf(travel).any(axis=1))[0][0])
+            raise ValueError(f"Ride {ride} can't reach every other ride over the walkways.")
+        if np.array_equal(self.weights, np.rint(self.weights)):
+            travel = travel.astype(np.int64)
+        return np.ascontiguousarray(travel)
+
+    def _adjacency(self) -> Tuple[List[int], List[int], List[float]]:
+        # Plain lists for the Dijkstra inner loop, where they index faster than arrays
+        if self._adjacency_lists is None:
+            self._adjacency_lists = (self.indptr.tolist(), self.indices.tolist(), self.weights.tolist())
+        return self._adjacency_lists
@@ -1,7 +1,79 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Sequence
+
+import numpy as np
+
+from anytime import Deadline, ImprovementCallback
+from cost import RouteCostModel
+
+
+class NeighborIndex:
+    """Each ride's row of travel times pre-sorted into nearest-first candidate order.
+
+    It only depends on the travel matrix, so one index serves every greedy query on a park.
+    Ride numbers are stored in the narrowest integer type that holds them.
+    """
+
+    def __init__(self, travel_times):
+        travel = np.asarray(travel_times)
+        dtype = np.int16 if len(travel) <= np.iinfo(np.int16).max else np.int32
+        self.order = np.empty(travel.shape, dtype=dtype)
+        self.sorted_travel = np.empty_like(travel)
+        # In blocks of rows, so argsort's int64 scratch stays small on large parks
+        for start in range(0, len(travel), 256):
+            block = travel[start:start + 256]
+            order = np.argsort(block, axis=1, kind='stable')
+            self.order[start:start + 256] = order
+            self.sorted_travel[start:start + 256] = np.take_along_axis(block, order, axis=1)
+        self._rows: Dict[int, Tuple[List[int], List[float]]] = {}
+
+    def row(self, ride: int) -> Tuple[List[int], List[float]]:
+        """Candidates of ``ride`` nearest first, with their travel times, as plain lists."""
+        row = self._rows.get(ride)
+        if row is None:
+            row = self._rows[ride] = (self.order[ride].tolist(), self.sorted_travel[ride].tolist())
+        return row
+
+    def nearest(self, current_ride: int, available: bytearray, rank: Sequence[int],
+                remaining_time: float) -> Tuple[int, float]:
+        """Nearest ride flagged in ``available`` that is reachable within ``remaining_time``.
+
+        Rides at the same distance go to the lowest ``rank``, i.e. the one the user listed first.
+        """
+        order, travel = self.row(current_ride)
+        for position, ride in enumerate(order):
+            if not available[ride] or ride == current_ride:
+                continue
+            travel_time = travel[position]
+            if travel_time > remaining_time:
+                # Every later candidate is at least as far away
+                break
+            best = ride
+            for tied in range(position + 1, len(order)):
+                if travel[tied] != travel_time:
+                    break
+                ride = order[tied]
+                if available[ride] and ride != current_ride and rank[ride] < rank[best]:
+                    best = ride
+            return best, travel_time
+        return None, float('inf')
+
+
+def worth_indexing(num_desired: int, num_rides: int) -> bool:
+    """Whether a ``NeighborIndex`` beats scanning the desired rides for the nearest one.
+
+    A step walks about ``num_rides / num_desired`` entries of an index row until it meets
+    a desired ride, against ``num_desired`` for a scan of the list.
+    """
+    return num_desired * num_desired > num_rides
 
 
 class GreedyAmusementParkOptimizer:
+    """Nearest desired ride next, until the next one no longer fits.
+
+    With a ``neighbor_index`` (e.g. a ``ParkCache``'s) long lists look rides up in it;
+    otherwise the desired rides are scanned, which is cheaper for short lists.
+    """
+
     def __init__(
             self,
             desired_rides: List[int],
@@ -12,6 +84,8 @@ class GreedyAmusementParkOptimizer:
             category_delays: Dict[str, int],
             day: str,
             day_category_effects: Dict[str, str],
+            cost_model: RouteCostModel = None,
+            neighbor_index: NeighborIndex = None,
     ):
         self.desired_rides = desired_rides
         self.time_limit = time_limit
@@ -25,50 +99,80 @@ class GreedyAmusementParkOptimizer:
         self.total_time = 0
         # Get the affected categories for the given day
         self.affected_category = self.day_category_effects.get(self.day, [])
+        if cost_model is None:
+            cost_model = RouteCostModel(ride_durations, travel_times, ride_categories, category_delays, day,
+                                        day_category_effects)
+        self.cost_model = cost_model
+        self.neighbor_index = neighbor_index
 
     def calculate_extra_delay(self, ride: int) -> float:
-        ride_category = self.ride_categories[ride]
-        if ride_category == self.affected_category:
-            percentage_delay = self.category_delays.get(ride_category, 0)
-            return (percentage_delay / 100) * self.ride_durations[ride]
-        return 0
+        return self.cost_model.penalty_list[ride]
 
-    def find_next_ride(self, current_ride: int, visited_rides: List[int], remaining_time: int) -> Tuple[int, float]:
+    @staticmethod
+    def nearest_listed(travel_row: List[float], rides: List[int], current_ride: int, available: bytearray,
+                       remaining_time: float) -> Tuple[int, float]:
+        """Like ``NeighborIndex.nearest``, scanning ``rides`` (listed order) with their travel times."""
         next_ride = None
         min_travel_time = float('inf')
-
-        for ride in self.desired_rides:
-            if ride in visited_rides or ride == current_ride:
-                continue
-
-            travel_time = self.travel_times[current_ride][ride]
-
-            if travel_time <= remaining_time and travel_time < min_travel_time:
-                min_travel_time = travel_time
+        for ride, travel_time in zip(rides, travel_row):
+            # Strictly nearer only, so ties go to the ride listed first
+            if travel_time < min_travel_time and available[ride] and ride != current_ride:
                 next_ride = ride
-
+                min_travel_time = travel_time
+        if min_travel_time > remaining_time:
+            return None, float('inf')
         return next_ride, min_travel_time
 
-    def run(self) -> Tuple[int, int]:
-        current_ride = 0
+    def run(self, time_budget: float = None, on_improvement: ImprovementCallback = None) -> Tuple[int, int]:
+        """Build the route; ``time_budget`` (seconds) stops it early with the route so far.
+
+        Every ride added is an improvement and is reported to ``on_improvement``.
+        """
+        deadline = Deadline(time_budget)
+        current_ride = self.cost_model.start_ride
         remaining_time = self.time_limit
         visited_rides = []
+        durations = self.cost_model.duration_list
+
+        # Desired, not yet visited rides as a flag per park ride
+        available = bytearray(self.cost_model.num_rides)
+        rank = [0] * self.cost_model.num_rides
+        for position, ride in reversed(list(enumerate(self.desired_rides))):
+            available[ride] = 1
+            rank[ride] = position
+
+        rides = list(dict.fromkeys(self.desired_rides))
+        index = self.neighbor_index
+        if index is None or not worth_indexing(len(rides), self.cost_model.num_rides):
+            index = None
+            # Travel rows restricted to the desired rides, for the rides a step can start from
+            sources = [current_ride, *rides]
+            block = self.cost_model.travel[np.ix_(np.asarray(sources, dtype=np.intp), np.asarray(rides, dtype=np.intp))]
+            rows = dict(zip(sources, block.tolist()))
 
-        while True:
-            next_ride, travel_time = self.find_next_ride(current_ride, visited_rides, remaining_time)
+        while not deadline.expired():
+            if index is not None:
+                next_ride, travel_time = index.nearest(current_ride, available, rank, remaining_time)
+            else:
+                next_ride, travel_time = self.nearest_listed(rows[current_ride], rides, current_ride, available,
+                                                             remaining_time)
 
             if next_ride is None:
                 break
 
-            extra_delay = self.calculate_extra_delay(next_ride)
-            total_time_spent = travel_time + self.ride_durations[next_ride] + extra_delay
+            total_time_spent = travel_time + durations[next_ride]
+            if self.cost_model.time_dependent:
+                total_time_spent += self.cost_model.wait(next_ride, self.time_limit - remaining_time + travel_time)
             remaining_time -= total_time_spent
 
             if remaining_time < 0:
                 break
 
             visited_rides.append(next_ride)
+            available[next_ride] = 0
             current_ride = next_ride
+            if on_improvement is not None:
+                on_improvement(list(visited_rides), len(visited_rides), self.time_limit - remaining_time)
 
         total_time = self.time_limit - remaining_time
         self.path = visited_rides
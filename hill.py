@@ -1,5 +1,15 @@
+import math
+import os
 import random
-from typing import List, Dict, Tuple
+import time
+from itertools import repeat
+from typing import List, Dict, Tuple, Optional
+
+import numpy as np
+
+from anytime import Deadline, ImprovementCallback, Incumbent
+from cost import RouteCostModel
+from moves import EPSILON, Move, RouteState
 
 
 class HillClimbParkOptimizer:
@@ -13,6 +23,7 @@ class HillClimbParkOptimizer:
             category_delays: Dict[str, int],
             day: str,
             day_category_effects: Dict[str, str],
+            cost_model: RouteCostModel = None,
     ):
         self.desired_rides = desired_rides
         self.time_limit = time_limit
@@ -24,30 +35,26 @@ class HillClimbParkOptimizer:
         self.day_category_effects = day_category_effects
         self.num_restarts = 5
         self.max_iterations_per_restart = 100
+        # Routes the first restarts climb from instead of random ones, e.g. a cached or greedy route
+        self.initial_solutions: List[List[int]] = []
         self.path = []
         self.total_time = 0
+        # Called as observer(event, **values) with convergence events, see instrument.Profile
+        self.observer = None
 
         # Get affected categories for the selected day
         self.affected_categories = self.day_category_effects.get(self.day, "")
+        if cost_model is None:
+            cost_model = RouteCostModel(ride_durations, travel_times, ride_categories, category_delays, day,
+                                        day_category_effects)
+        self.cost_model = cost_model
 
-    def get_ride_delay(self, ride_index: int) -> int:
+    def get_ride_delay(self, ride_index: int) -> float:
         """Calculate the additional delay for a given ride based on its categories."""
-        delay = 0
-        category = self.ride_categories[ride_index] # currently using option of one category per ride
-        if category is self.affected_categories:
-            delay += (self.category_delays.get(category, 0) / 100) * self.ride_durations[ride_index]
-        return delay
-
-    def calculate_total_time(self, path: List[int]) -> int:
-        total_time = 0
-        current_ride = 0  # Start from ride 0
-        for ride in path:
-            # Calculate the delay for the ride
-            delay = self.get_ride_delay(ride)
-            # Add travel time and ride duration with delay
-            total_time += self.travel_times[current_ride][ride] + self.ride_durations[ride] + delay
-            current_ride = ride
-        return total_time
+        return self.cost_model.penalty_list[ride_index]
+
+    def calculate_total_time(self, path: List[int]) -> float:
+        return self.cost_model.route_time(path)
 
     def is_valid_solution(self, path: List[int]) -> bool:
         return self.calculate_total_time(path) <= self.time_limit
@@ -57,13 +64,11 @@ class HillClimbParkOptimizer:
         remaining_rides = self.desired_rides.copy()
         random.shuffle(remaining_rides)
         current_time = 0
-        current_ride = 0
+        current_ride = self.cost_model.start_ride
 
         for ride in remaining_rides:
-            # Calculate the delay for the ride
-            delay = self.get_ride_delay(ride)
-            # Calculate time to add
-            time_to_add = self.travel_times[current_ride][ride] + self.ride_durations[ride] + delay
+            # Travel plus ride duration, with the day's delay already folded in
+            time_to_add = self.cost_model.leg_time(current_ride, ride, current_time)
             if current_time + time_to_add <= self.time_limit:
                 solution.append(ride)
                 current_time += time_to_add
@@ -73,62 +78,203 @@ class HillClimbParkOptimizer:
 
         return solution
 
+    def restart_solution(self, restart: int) -> List[int]:
+        """Starting route of restart ``restart``: a feasible initial solution if given, else a random one."""
+        if restart < len(self.initial_solutions) and self.is_valid_solution(self.initial_solutions[restart]):
+            return list(self.initial_solutions[restart])
+        return self.generate_random_solution()
+
     def get_neighbors(self, solution: List[int]) -> List[List[int]]:
-        neighbors = []
+        state = RouteState(self.cost_model, solution)
+        limit = self.time_limit + EPSILON - state.total_time
+        # Add a ride, or swap two rides
+        moves = self.insert_moves(state) + self.swap_moves(state)
+        if self.waits_vary(state):
+            deltas = state.batch_deltas(moves).tolist()
+        else:
+            deltas = [state.insert_delta(move.ride, move.i) if move.kind == 'insert' else state.swap_delta(move.i, move.j)
+                      for move in moves]
+        return [state.applied(move) for move, delta in zip(moves, deltas) if delta <= limit]
+
+    def waits_vary(self, state: RouteState) -> bool:
+        return state.waits_vary() or any(state.waits_vary(ride) for ride in self.desired_rides)
+
+    def insert_moves(self, state: RouteState) -> List[Move]:
+        in_route = set(state.route)
+        return [Move('insert', i, -1, ride, 0.0) for ride in self.desired_rides if ride not in in_route
+                for i in range(len(state.route) + 1)]
+
+    def swap_moves(self, state: RouteState) -> List[Move]:
+        length = len(state.route)
+        return [Move('swap', i, j, -1, 0.0) for i in range(length) for j in range(i + 1, length)]
+
+    def best_move(self, state: RouteState) -> Optional[Move]:
+        """Find the best improving insert or swap move without materializing any neighbor.
 
-        # Add a ride
+        Any feasible insert beats every swap because it adds a ride, so swaps are only
+        scanned when no ride fits; a swap must then strictly shorten the route.
+        """
+        if self.waits_vary(state):
+            return self._best_batched_move(state)
+        route = state.route
+        slack = self.time_limit + EPSILON - state.total_time
+        best = None
+        best_delta = float('inf')
+
+        in_route = set(route)
         for ride in self.desired_rides:
-            if ride not in solution:
-                for i in range(len(solution) + 1):
-                    new_solution = solution[:i] + [ride] + solution[i:]
-                    if self.is_valid_solution(new_solution):
-                        neighbors.append(new_solution)
-
-        # Swap two rides
-        for i in range(len(solution)):
-            for j in range(i + 1, len(solution)):
-                new_solution = solution.copy()
-                new_solution[i], new_solution[j] = new_solution[j], new_solution[i]
-                if self.is_valid_solution(new_solution):
-                    neighbors.append(new_solution)
-
-        return neighbors
-
-    def hill_climbing(self, initial_solution: List[int]) -> List[int]:
-        current_solution = initial_solution
-        current_score = (len(current_solution), -self.calculate_total_time(current_solution))
-
-        for _ in range(self.max_iterations_per_restart):
-            neighbors = self.get_neighbors(current_solution)
-            if not neighbors:
+            if ride in in_route:
+                continue
+            for i in range(len(route) + 1):
+                delta = state.insert_delta(ride, i)
+                if delta <= slack and delta < best_delta:
+                    best, best_delta = ('insert', i, -1, ride), delta
+        if best is not None:
+            return Move(*best, best_delta)
+
+        best_delta = -EPSILON
+        for i in range(len(route)):
+            for j in range(i + 1, len(route)):
+                delta = state.swap_delta(i, j)
+                if delta < best_delta:
+                    best, best_delta = ('swap', i, j, -1), delta
+        if best is not None:
+            return Move(*best, best_delta)
+        return None
+
+    def _best_batched_move(self, state: RouteState) -> Optional[Move]:
+        # With queue waits every delta rescores a suffix, so each pass's candidates are
+        # scored together; argmin keeps the scalar scan's first-best tie-break
+        slack = self.time_limit + EPSILON - state.total_time
+        inserts = self.insert_moves(state)
+        if inserts:
+            deltas = state.batch_deltas(inserts)
+            deltas[deltas > slack] = np.inf
+            best = int(np.argmin(deltas))
+            if deltas[best] < np.inf:
+                return inserts[best]._replace(delta=float(deltas[best]))
+        swaps = self.swap_moves(state)
+        if swaps:
+            deltas = state.batch_deltas(swaps)
+            best = int(np.argmin(deltas))
+            if deltas[best] < -EPSILON:
+                return swaps[best]._replace(delta=float(deltas[best]))
+        return None
+
+    def hill_climbing(self, initial_solution: List[int], incumbent=None, deadline: float = None) -> Optional[List[int]]:
+        """Climb from ``initial_solution`` until no move improves it.
+
+        ``incumbent`` is a shared ride count (a ``multiprocessing.Value``); the climb is
+        abandoned, returning None, once it can no longer reach that many rides.
+        ``deadline`` is a ``time.time()`` value after which the current route is returned.
+        """
+        state = RouteState(self.cost_model, initial_solution)
+        if incumbent is not None:
+            ride_bound = self.cost_model.ride_count_bound(self.desired_rides, self.time_limit)
+
+        for iteration in range(self.max_iterations_per_restart):
+            if incumbent is not None:
+                # Each remaining iteration adds at most one ride
+                reachable = min(len(state.route) + self.max_iterations_per_restart - iteration, ride_bound)
+                if reachable < incumbent.value:
+                    return None
+            if deadline is not None and time.time() >= deadline:
+                break
+            move = self.best_move(state)
+            if move is None:
                 break
+            # Only the chosen move is ever applied to the route
+            state.apply(move)
+            if self.observer is not None:
+                self.observer('climb', iteration=iteration, rides=len(state.route), total_time=state.total_time)
 
-            best_neighbor = max(
-                neighbors, key=lambda sol: (len(sol), -self.calculate_total_time(sol))
-            )
-            best_neighbor_score = (len(best_neighbor), -self.calculate_total_time(best_neighbor))
+        return state.route
 
-            if best_neighbor_score <= current_score:
+    def run(self, time_budget: float = None, on_improvement: ImprovementCallback = None) -> Tuple[int, int]:
+        """Run the restarts; ``time_budget`` (seconds) cuts them short with the best route so far.
+
+        The first restart always produces a route. Each new best is reported to ``on_improvement``.
+        """
+        deadline = Deadline(time_budget)
+        incumbent = Incumbent(on_improvement)
+
+        for restart in range(self.num_restarts):
+            if restart and deadline.expired():
                 break
+            solution = self.hill_climbing(self.restart_solution(restart), deadline=deadline.at)
+            total_time = self.calculate_total_time(solution)
+            incumbent.offer(solution, total_time)
+            if self.observer is not None:
+                self.observer('restart', restart=restart, rides=len(solution), total_time=total_time,
+                              best_rides=len(incumbent.path))
+
+        best_solution = incumbent.path
+        total_time = self.calculate_total_time(best_solution)
+        self.path = best_solution
+        self.total_time = total_time
+        return len(best_solution), total_time
 
-            current_solution = best_neighbor
-            current_score = best_neighbor_score
+    def run_parallel(self, num_restarts: int = None, max_workers: int = None, time_budget: float = None,
+                     seed: int = 0) -> Tuple[int, float]:
+        """Run restarts across worker processes that share the best ride count found so far.
 
-        return current_solution
+        Restarts that can no longer beat the shared incumbent are abandoned early, and with
+        ``time_budget`` (seconds) no restart runs past the wall-clock deadline. Restart ``i``
+        is seeded from (seed, i) and ties go to the lowest restart, so without a budget the
+        result doesn't depend on the worker count.
+        """
+        # Imported here so single-process runs don't pay for the pool machinery
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
 
-    def run(self) -> Tuple[int, int]:
-        best_solution = []
-        best_score = (0, 0)
+        num_restarts = self.num_restarts if num_restarts is None else num_restarts
+        max_workers = max_workers or os.cpu_count() or 1
+        deadline = time.time() + time_budget if time_budget is not None else None
+        batch_size = max(1, math.ceil(num_restarts / (max_workers * 4)))
+        batches = [range(start, min(start + batch_size, num_restarts)) for start in range(0, num_restarts, batch_size)]
 
-        for _ in range(self.num_restarts):
-            initial_solution = self.generate_random_solution()
-            solution = self.hill_climbing(initial_solution)
-            score = (len(solution), -self.calculate_total_time(solution))
+        incumbent = multiprocessing.Value('i', 0)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_restart_worker,
+                                 initargs=(self, incumbent)) as executor:
+            outcomes = list(executor.map(_run_restarts, batches, repeat(seed), repeat(deadline)))
 
-            if score > best_score:
-                best_solution = solution
-                best_score = score
+        best_solution = []
+        best_key = ((0, 0), 0)
+        for outcome in outcomes:
+            if outcome is not None and outcome[0] > best_key:
+                best_key, best_solution = outcome
         total_time = self.calculate_total_time(best_solution)
         self.path = best_solution
         self.total_time = total_time
         return len(best_solution), total_time
+
+
+# Set in each restart worker by _init_restart_worker
+_worker_optimizer: Optional[HillClimbParkOptimizer] = None
+_worker_incumbent = None
+
+
+def _init_restart_worker(optimizer: HillClimbParkOptimizer, incumbent):
+    global _worker_optimizer, _worker_incumbent
+    _worker_optimizer = optimizer
+    _worker_incumbent = incumbent
+
+
+def _run_restarts(restarts: range, seed: int, deadline: Optional[float]):
+    optimizer = _worker_optimizer
+    best = None
+    for restart in restarts:
+        if deadline is not None and time.time() >= deadline:
+            break
+        random.seed(f"{seed}:{restart}")
+        solution = optimizer.hill_climbing(optimizer.restart_solution(restart), _worker_incumbent, deadline)
+        if solution is None:
+            continue
+        with _worker_incumbent.get_lock():
+            if len(solution) > _worker_incumbent.value:
+                _worker_incumbent.value = len(solution)
+        # Rank by score, then prefer the earliest restart
+        key = ((len(solution), -optimizer.calculate_total_time(solution)), -restart)
+        if best is None or key > best[0]:
+            best = (key, solution)
+    return best
@@ -0,0 +1,152 @@
+"""Opt-in instrumentation for the optimizers.
+
+Nothing here is imported or called unless a ``Profile`` is used, so uninstrumented runs
+pay nothing beyond one ``observer is None`` check per iteration or generation. A profile
+wraps an optimizer instance's methods to count and time calls, subscribes to its
+convergence events and can trace memory; results export as JSON::
+
+    profile = Profile()
+    profile.run(build_optimizer('hill', park_data, user_data), label='hill')
+    profile.to_json('profile.json')
+"""
+import inspect
+import json
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List
+
+# Optimizer methods whose calls are counted and timed, where the optimizer has them
+INSTRUMENTED_METHODS = (
+    'calculate_total_time', 'is_feasible', 'is_valid_solution', 'get_neighbors', 'best_move', 'hill_climbing',
+    'generate_random_solution', 'fitness_function', 'population_fitness', 'evaluate', 'generate_population',
+    'generate_chromosome', 'selection', 'crossover', 'mutate', 'solve',
+)
+
+
+class Profile:
+    """Evaluation counts, per-method timings, convergence curves and memory of optimizer runs.
+
+    Names are prefixed with the ``label`` of the run that produced them, so one profile
+    can collect several algorithms side by side.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.counters: Counter = Counter()
+        self.timings: Dict[str, float] = defaultdict(float)
+        self.curves: Dict[str, List[dict]] = defaultdict(list)
+        self.memory: Dict[str, dict] = {}
+        self._prefix = ''
+        self._started = time.perf_counter()
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[self._prefix + name] += amount
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block of code under ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[self._prefix + name] += time.perf_counter() - start
+            self.counters[self._prefix + name] += 1
+
+    def observe(self, event: str, **values):
+        """Observer hook the optimizers call with convergence events (restarts, generations...)."""
+        values['elapsed'] = time.perf_counter() - self._started
+        self.curves[self._prefix + event].append(values)
+
+    def instrument(self, optimizer):
+        """Count and time the optimizer's methods by wrapping them on this instance only."""
+        for name in INSTRUMENTED_METHODS:
+            method = getattr(optimizer, name, None)
+            if method is not None:
+                setattr(optimizer, name, self._wrap(optimizer, name, method))
+        optimizer.observer = self.observe
+
+    def release(self, optimizer):
+        """Undo :meth:`instrument`, so the optimizer runs at full speed (and pickles) again."""
+        for name in INSTRUMENTED_METHODS:
+            optimizer.__dict__.pop(name, None)
+        optimizer.observer = None
+
+    def run(self, optimizer, label: str = None, **run_kwargs):
+        """Run ``optimizer`` instrumented and return what its ``run`` returns."""
+        self._prefix = f"{label}." if label else ''
+        self._started = time.perf_counter()
+        if 'on_improvement' in inspect.signature(optimizer.run).parameters:
+            run_kwargs.setdefault('on_improvement', self._record_improvement)
+        self.instrument(optimizer)
+        if self.trace_memory:
+            tracemalloc.start()
+        try:
+            with self.phase('run'):
+                return optimizer.run(**run_kwargs)
+        finally:
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+                tracemalloc.stop()
+                self.memory[self._prefix + 'run'] = {'peak_bytes': peak, 'retained_bytes': current,
+                                                     'retained_blocks': blocks}
+            self.release(optimizer)
+            self._prefix = ''
+
+    def to_dict(self) -> dict:
+        return {
+            'counters': dict(self.counters),
+            'timings': dict(self.timings),
+            'curves': dict(self.curves),
+            'memory': self.memory,
+        }
+
+    def to_json(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=float)
+
+    def _record_improvement(self, path: List[int], num_rides: int, total_time: float):
+        self.observe('improvement', rides=num_rides, total_time=total_time)
+
+    def _wrap(self, optimizer, name: str, method):
+        prefix = self._prefix
+        counters, timings = self.counters, self.timings
+        key = prefix + name
+
+        @wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            timings[key] += time.perf_counter() - start
+            counters[key] += 1
+            if name == 'get_neighbors':
+                self._count_neighbors(prefix, optimizer, args[0], result)
+            elif name == 'best_move':
+                self._count_moves(prefix, optimizer, args[0].route, result)
+            return result
+
+        return timed
+
+    def _count_neighbors(self, prefix: str, optimizer, solution: List[int], neighbors: List[List[int]]):
+        # get_neighbors tries every insert position of every missing ride and every swap,
+        # and keeps the ones that fit in the time limit
+        in_solution = set(solution)
+        missing = sum(ride not in in_solution for ride in optimizer.desired_rides)
+        length = len(solution)
+        tried = missing * (length + 1) + length * (length - 1) // 2
+        self.counters[prefix + 'neighbors.generated'] += tried
+        self.counters[prefix + 'neighbors.rejected'] += tried - len(neighbors)
+
+    def _count_moves(self, prefix: str, optimizer, route: List[int], move):
+        # best_move prices every insert and only scans swaps when no insert fits
+        in_route = set(route)
+        missing = sum(ride not in in_route for ride in optimizer.desired_rides)
+        length = len(route)
+        evaluated = missing * (length + 1)
+        if move is None or move.kind == 'swap':
+            evaluated += length * (length - 1) // 2
+        self.counters[prefix + 'moves.evaluated'] += evaluated
+        self.counters[prefix + 'moves.applied'] += move is not None
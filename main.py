@@ -1,64 +1,20 @@
+import random
 import time
 
-import matplotlib.pyplot as plt
-from hill import *
+# Only lightweight modules at the top: the single-route CLI imports just the selected
+# optimizer (through runner), and plotting libraries load only in simulation mode.
 from util import *
-from cat import *
-from greedy import *
-import numpy as np
-
-
-def run_optimization_algorithms(park_data: ParkData, user_data: UserData):
-    # Hill climbing optimization
-    optimizer = HillClimbParkOptimizer(
-        user_data.desired_rides,
-        user_data.total_time_available,
-        park_data.ride_times,
-        park_data.travel_times,
-        park_data.ride_categories,
-        park_data.category_time_addition,
-        user_data.visit_day,
-        park_data.day_category_affect
-    )
-    start_time = time.time()
-    num_rides_hill, total_time_hill = optimizer.run()
-    end_time = time.time()
-    comp_time_hill = end_time - start_time
-
-    # Genetic algorithm optimization
-    optimizer = GeneticAlgorithm(
-        park_data.ride_times,
-        park_data.travel_times,
-        park_data.ride_categories,
-        park_data.category_time_addition,
-        park_data.day_category_affect,
-        user_data.desired_rides,
-        user_data.visit_day,
-        user_data.total_time_available
-    )
-    start_time = time.time()
-    num_rides_genetic, total_time_genetic = optimizer.run()
-    end_time = time.time()
-    comp_time_gen = end_time - start_time
-
-    # Basic algorithm optimization
-    optimizer = GreedyAmusementParkOptimizer(
-        user_data.desired_rides,
-        user_data.total_time_available,
-        park_data.ride_times,
-        park_data.travel_times,
-        park_data.ride_categories,
-        park_data.category_time_addition,
-        user_data.visit_day,
-        park_data.day_category_affect
-    )
-    start_time = time.time()
-    num_rides_greedy, total_time_greedy = optimizer.run()
-    end_time = time.time()
-    comp_time_greedy = end_time - start_time
-
-    return (num_rides_hill, total_time_hill, comp_time_hill), (num_rides_genetic, total_time_genetic, comp_time_gen), (
-        num_rides_greedy, total_time_greedy, comp_time_greedy)
+from runner import ALGORITHMS, build_optimizer, run_algorithm, run_simulations_parallel
+
+
+def run_optimization_algorithms(park_data: ParkData, user_data: UserData, profile=None):
+    from cost import RouteCostModel
+
+    # Compile the park's route costs once and share them between the optimizers
+    cost_model = RouteCostModel.from_data(park_data, user_data)
+
+    # One (rides, total time, computation time) tuple per algorithm: hill, genetic, greedy, exact
+    return tuple(run_algorithm(algorithm, park_data, user_data, cost_model, profile) for algorithm in ALGORITHMS)
 
 
 def generate_park_and_user_data(num_parks: int):
@@ -74,17 +30,21 @@ def generate_park_and_user_data(num_parks: int):
     return park_names, park_user_data
 
 
-def run_simulations(park_names, park_user_data):
+def run_simulations(park_names, park_user_data, profile=None):
+    # An instrument.Profile here collects counters and curves of every run, per algorithm
     results = {
         'hill': {'rides': [], 'time': [], 'complexity': []},
         'genetic': {'rides': [], 'time': [], 'complexity': []},
-        'greedy': {'rides': [], 'time': [], 'complexity': []}
+        'greedy': {'rides': [], 'time': [], 'complexity': []},
+        'exact': {'rides': [], 'time': [], 'complexity': []}
     }
 
     for park_data, user_data in park_user_data:
 
         (num_rides_hill, total_time_hill, comp_time_hill), (num_rides_genetic, total_time_genetic, comp_time_gen), (
-            num_rides_greedy, total_time_greedy, comp_time_greedy) = run_optimization_algorithms(park_data, user_data)
+            num_rides_greedy, total_time_greedy, comp_time_greedy), (
+            num_rides_exact, total_time_exact, comp_time_exact) = run_optimization_algorithms(
+            park_data, user_data, profile)
 
         results['hill']['rides'].append(num_rides_hill)
         results['hill']['time'].append(total_time_hill)
@@ -95,40 +55,46 @@ def run_simulations(park_names, park_user_data):
         results['greedy']['rides'].append(num_rides_greedy)
         results['greedy']['time'].append(total_time_greedy)
         results['greedy']['complexity'].append(comp_time_greedy)
+        results['exact']['rides'].append(num_rides_exact)
+        results['exact']['time'].append(total_time_exact)
+        results['exact']['complexity'].append(comp_time_exact)
 
     return results
 
 
 def plot_results(park_names, results, park_user_data):
+    import matplotlib.pyplot as plt
+    import numpy as np
+
     num_parks = len(park_names)
-    algorithms = ['Hill Climbing', 'Genetic Algorithm', 'Greedy Algorithm']
-    colors = ['skyblue', 'lightgreen', 'lightcoral']
+    algorithms = ['Hill Climbing', 'Genetic Algorithm', 'Greedy Algorithm', 'Exact (DP)']
+    colors = ['skyblue', 'lightgreen', 'lightcoral', 'plum']
 
     x = np.arange(num_parks)  # the label locations
-    width = 0.25  # the width of the bars
+    width = 0.2  # the width of the bars
 
     # Plot number of rides
     fig, ax = plt.subplots(figsize=(15, 8))
-    for i, (algo, color) in enumerate(zip(['hill', 'genetic', 'greedy'], colors)):
+    for i, (algo, color) in enumerate(zip(['hill', 'genetic', 'greedy', 'exact'], colors)):
         ax.bar(x + i * width, results[algo]['rides'], width, label=algorithms[i], color=color)
 
     ax.set_xlabel('Park')
     ax.set_ylabel('Number of Rides')
     ax.set_title('Number of Rides in Optimal Sequence')
-    ax.set_xticks(x + width)
+    ax.set_xticks(x + 1.5 * width)
     ax.set_xticklabels(park_names, rotation=90)
     ax.legend()
     plt.tight_layout()
 
     # Plot total time
     fig, ax = plt.subplots(figsize=(15, 8))
-    for i, (algo, color) in enumerate(zip(['hill', 'genetic', 'greedy'], colors)):
+    for i, (algo, color) in enumerate(zip(['hill', 'genetic', 'greedy', 'exact'], colors)):
         ax.bar(x + i * width, results[algo]['time'], width, label=algorithms[i], color=color)
 
     ax.set_xlabel('Park')
     ax.set_ylabel('Total Time (minutes)')
     ax.set_title('Total Time of Rides in Optimal Sequence')
-    ax.set_xticks(x + width)
+    ax.set_xticks(x + 1.5 * width)
     ax.set_xticklabels(park_names, rotation=90)
     ax.legend()
     plt.tight_layout()
@@ -141,7 +107,7 @@ def plot_results(park_names, results, park_user_data):
     sorted_num_rides_list = np.array(num_rides_list)[sorted_indices]
 
     fig, ax = plt.subplots(figsize=(15, 8))
-    for i, (algo, color) in enumerate(zip(['hill', 'genetic', 'greedy'], colors)):
+    for i, (algo, color) in enumerate(zip(['hill', 'genetic', 'greedy', 'exact'], colors)):
         # Sort the complexity times based on the sorted order of num_rides_list
         sorted_complexity = np.array(results[algo]['complexity'])[sorted_indices]
         ax.bar(x + i * width, sorted_complexity, width, label=algorithms[i], color=color)
@@ -149,7 +115,7 @@ def plot_results(park_names, results, park_user_data):
     ax.set_xlabel('Number of Rides in the Park (sorted)')
     ax.set_ylabel('Computation Time (seconds)')
     ax.set_title('Computation Time as a Function of Number of Rides (Sorted by Park Size)')
-    ax.set_xticks(x + width)
+    ax.set_xticks(x + 1.5 * width)
     ax.set_xticklabels(sorted_num_rides_list, rotation=90)
     ax.legend()
     plt.tight_layout()
@@ -173,46 +139,20 @@ if __name__ == "__main__":
         user_data = UserData(num_rides, desired_rides, total_time_available, visit_day)
 
         # Run the selected algorithm
-        if algorithm == 'greedy':
-            optimizer = GreedyAmusementParkOptimizer(
-                user_data.desired_rides,
-                user_data.total_time_available,
-                park_data.ride_times,
-                park_data.travel_times,
-                park_data.ride_categories,
-                park_data.category_time_addition,
-                user_data.visit_day,
-                park_data.day_category_affect
-            )
-        elif algorithm == 'hill':
-            optimizer = HillClimbParkOptimizer(
-                user_data.desired_rides,
-                user_data.total_time_available,
-                park_data.ride_times,
-                park_data.travel_times,
-                park_data.ride_categories,
-                park_data.category_time_addition,
-                user_data.visit_day,
-                park_data.day_category_affect
-            )
-        elif algorithm == 'genetic':
-            optimizer = GeneticAlgorithm(
-                park_data.ride_times,
-                park_data.travel_times,
-                park_data.ride_categories,
-                park_data.category_time_addition,
-                park_data.day_category_affect,
-                user_data.desired_rides,
-                user_data.visit_day,
-                user_data.total_time_available
-            )
-        else:
+        try:
+            optimizer = build_optimizer(algorithm, park_data, user_data)
+        except ValueError:
             print(f"Unknown algorithm: {algorithm}")
             sys.exit(1)
 
         # Measure computation time
         start_time = time.time()
-        num_rides_result, total_time_result = optimizer.run()
+        try:
+            num_rides_result, total_time_result = optimizer.run()
+        except ValueError as error:
+            # The exact solver refuses lists longer than its max_rides
+            print(f"{error} Try the bnb algorithm for longer lists.")
+            sys.exit(1)
         end_time = time.time()
         comp_time = end_time - start_time
 
@@ -228,10 +168,12 @@ if __name__ == "__main__":
         print(f"Number of rides in the returned path: {num_rides_result}")
         print(f"Total time of the path: {total_time_result} minutes")
         print(f"Returned path: {path}")
+        if not getattr(optimizer, 'proven_optimal', True):
+            print("The search stopped at its limit, so this path is not proven optimal.")
 
     else:
         # Run simulations as before
         num_parks = 50
         park_names, park_user_data = generate_park_and_user_data(num_parks)
-        results = run_simulations(park_names, park_user_data)
+        results = run_simulations_parallel(park_names, park_user_data)
         plot_results(park_names, results, park_user_data)
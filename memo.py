@@ -0,0 +1,170 @@
+"""Memoized route results for repeated requests.
+
+Requests are keyed by a canonical fingerprint: algorithm, park contents, visit day, the
+set of desired rides (order and duplicates ignored) and the time budget. A hit returns
+the stored route without running an optimizer. On a miss, a route cached for the same
+rides with a smaller budget still fits the larger one, so it seeds hill climbing.
+"""
+import hashlib
+import json
+import os
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from runner import RouteResult, build_optimizer
+from util import ParkData, UserData
+
+if TYPE_CHECKING:
+    from instrument import Profile
+
+FORMAT_VERSION = 1
+
+_park_fingerprints: "weakref.WeakKeyDictionary[ParkData, str]" = weakref.WeakKeyDictionary()
+
+
+def park_fingerprint(park_data: ParkData) -> str:
+    """Digest of everything in the park that affects route costs; computed once per park object."""
+    fingerprint = _park_fingerprints.get(park_data)
+    if fingerprint is None:
+        digest = hashlib.sha1()
+        digest.update(np.ascontiguousarray(park_data.ride_times, dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(park_data.travel_times, dtype=np.float64).tobytes())
+        digest.update(json.dumps([list(park_data.ride_categories), park_data.category_time_addition,
+                                  park_data.day_category_affect], sort_keys=True).encode('utf-8'))
+        if park_data.queue_model is not None:
+            digest.update(park_data.queue_model.table.tobytes())
+        fingerprint = _park_fingerprints[park_data] = digest.hexdigest()
+    return fingerprint
+
+
+def request_key(algorithm: str, park_data: ParkData, user_data: UserData) -> Tuple:
+    """Canonical fingerprint of a request; equal for requests that only differ in ride order."""
+    # The start time only changes costs when the park has queues
+    start_minute = user_data.start_minute if park_data.queue_model is not None else None
+    return (algorithm, park_fingerprint(park_data), user_data.visit_day, start_minute,
+            tuple(sorted(set(user_data.desired_rides))), user_data.total_time_available)
+
+
+class RouteCache:
+    """LRU cache of route results with an optional time to live and JSON persistence.
+
+    At most ``max_entries`` results are kept; with ``ttl`` (seconds) older ones count
+    as misses. With ``path`` the cache is loaded from that file if it exists and
+    :meth:`save` writes it back.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = None, path: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.entries: "OrderedDict[Tuple, Tuple[RouteResult, float]]" = OrderedDict()
+        # Request key without the budget -> cached budgets, for warm starts
+        self.budgets: Dict[Tuple, Dict[float, Tuple]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.warm_starts = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Tuple) -> Optional[RouteResult]:
+        entry = self.entries.get(key)
+        if entry is None or self._expired(entry):
+            if entry is not None:
+                self._discard(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: Tuple, result: RouteResult, stored_at: float = None):
+        self.entries[key] = (result, time.time() if stored_at is None else stored_at)
+        self.entries.move_to_end(key)
+        self.budgets.setdefault(key[:-1], {})[key[-1]] = key
+        while len(self.entries) > self.max_entries:
+            self._discard(next(iter(self.entries)))
+
+    def warm_start(self, key: Tuple) -> Optional[List[int]]:
+        """Best cached route for the same request with a smaller budget, which also fits this one."""
+        budgets = self.budgets.get(key[:-1], {})
+        best = None
+        for budget, smaller_key in budgets.items():
+            entry = self.entries.get(smaller_key)
+            if budget < key[-1] and entry is not None and not self._expired(entry):
+                if best is None or (entry[0].num_rides, -entry[0].total_time) > (best.num_rides, -best.total_time):
+                    best = entry[0]
+        return None if best is None else list(best.path)
+
+    def optimize(self, algorithm: str, park_data: ParkData, user_data: UserData, **build_kwargs) -> RouteResult:
+        """Cached result of running ``algorithm`` for this request, computing it on a miss.
+
+        ``build_kwargs`` are passed to :func:`runner.build_optimizer`.
+        """
+        key = request_key(algorithm, park_data, user_data)
+        result = self.get(key)
+        if result is not None:
+            return result
+        return self.compute(key, build_optimizer(algorithm, park_data, user_data, **build_kwargs))
+
+    def compute(self, key: Tuple, optimizer, profile: "Profile" = None) -> RouteResult:
+        """Run ``optimizer`` for the request ``key``, warm-started when possible, and cache its result.
+
+        With ``profile`` the run is instrumented and recorded under the algorithm's name.
+        """
+        if hasattr(optimizer, 'initial_solutions'):
+            route = self.warm_start(key)
+            if route:
+                optimizer.initial_solutions = [route]
+                self.warm_starts += 1
+        if profile is not None:
+            num_rides, total_time = profile.run(optimizer, label=key[0])
+        else:
+            num_rides, total_time = optimizer.run()
+        result = RouteResult(list(optimizer.path), num_rides, total_time)
+        self.put(key, result)
+        return result
+
+    def save(self, path: str = None):
+        """Write the live entries to ``path`` (default: the cache's own path) as JSON."""
+        path = path or self.path
+        entries = [[list(key[:-2]) + [list(key[-2]), key[-1]], list(result.path), result.num_rides,
+                    result.total_time, stored_at]
+                   for key, (result, stored_at) in self.entries.items() if not self._expired((result, stored_at))]
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump({'version': FORMAT_VERSION, 'entries': entries}, f)
+        # Replace in one step, so a crash never leaves a half-written cache behind
+        os.replace(temporary, path)
+
+    def load(self, path: str):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported route cache version {data.get('version')} in {path}.")
+        for key, path_rides, num_rides, total_time, stored_at in data['entries']:
+            key = tuple(key[:-2]) + (tuple(key[-2]), key[-1])
+            entry = (RouteResult(path_rides, num_rides, total_time), stored_at)
+            if not self._expired(entry):
+                self.put(key, *entry)
+
+    def clear(self):
+        self.entries.clear()
+        self.budgets.clear()
+
+    def _expired(self, entry) -> bool:
+        return self.ttl is not None and time.time() - entry[1] > self.ttl
+
+    def _discard(self, key: Tuple):
+        del self.entries[key]
+        budgets = self.budgets.get(key[:-1])
+        if budgets is not None:
+            budgets.pop(key[-1], None)
+            if not budgets:
+                del self.budgets[key[:-1]]
@@ -0,0 +1,226 @@
+from typing import List, NamedTuple, Sequence
+
+import numpy as np
+
+from cost import RouteCostModel
+
+# Slack for comparing route times rebuilt from float deltas against the limit
+EPSILON = 1e-9
+
+
+class Move(NamedTuple):
+    """A neighborhood move on a route, described by positions instead of a copied route.
+
+    ``insert`` puts ``ride`` at position ``i``, ``swap`` exchanges positions ``i < j``,
+    ``reverse`` reverses positions ``i..j`` (a 2-opt move) and ``remove`` drops
+    position ``i``. ``delta`` is the change in total route time.
+    """
+    kind: str
+    i: int
+    j: int
+    ride: int
+    delta: float
+
+
+class RouteState:
+    """A route together with its prefix finish times, so move deltas cost O(1).
+
+    With time-dependent waits a move shifts the waits of every later ride, so deltas are
+    then computed by rescoring the route from the first position the move changes, or
+    for many moves at once with :meth:`batch_deltas`. Rides whose wait is the same all
+    day don't count: while every ride involved has such a wait, deltas stay O(1).
+    """
+
+    def __init__(self, cost_model: RouteCostModel, route: Sequence[int]):
+        self.cost_model = cost_model
+        self.route: List[int] = list(route)
+        self.arrivals: List[float] = []
+        # With queues, the first position from which every ride waits the same at any time
+        self._flat_from = 0
+        self._flat = None
+        # Prefix sums of walks along the route and against it, built on first reverse_delta
+        self._walks = None
+        self.refresh()
+
+    @property
+    def total_time(self) -> float:
+        return self.arrivals[-1] if self.arrivals else 0.0
+
+    def refresh(self):
+        self._walks = None
+        if self.cost_model.time_dependent:
+            self.arrivals = self.cost_model.arrival_times(self.route).tolist()
+            flat = self._flat = self.cost_model.queue_model.flat
+            self._flat_from = len(self.route)
+            while self._flat_from and flat[self.route[self._flat_from - 1]]:
+                self._flat_from -= 1
+            return
+        travel = self.cost_model.travel_list
+        durations = self.cost_model.duration_list
+        arrivals = []
+        total_time = 0.0
+        current_ride = self.cost_model.start_ride
+        for ride in self.route:
+            total_time += travel[current_ride][ride] + durations[ride]
+            arrivals.append(total_time)
+            current_ride = ride
+        self.arrivals = arrivals
+
+    def waits_vary(self, ride: int = None) -> bool:
+        """Whether a ride of the route, or ``ride``, has a wait that depends on when it is reached."""
+        if not self.cost_model.time_dependent:
+            return False
+        return self._flat_from > 0 or (ride is not None and not self._flat[ride])
+
+    def insert_delta(self, ride: int, i: int) -> float:
+        if self.cost_model.time_dependent and self.waits_vary(ride):
+            return self._evaluated_delta(Move('insert', i, -1, ride, 0.0))
+        travel = self.cost_model.travel_list
+        route = self.route
+        previous = route[i - 1] if i > 0 else self.cost_model.start_ride
+        delta = travel[previous][ride] + self.cost_model.duration_list[ride]
+        if self.cost_model.time_dependent:
+            delta += self.cost_model.wait(ride, 0.0)
+        if i < len(route):
+            following = route[i]
+            delta += travel[ride][following] - travel[previous][following]
+        return delta
+
+    def swap_delta(self, i: int, j: int) -> float:
+        if self.cost_model.time_dependent and self._flat_from:
+            return self._evaluated_delta(Move('swap', i, j, -1, 0.0))
+        travel = self.cost_model.travel_list
+        route = self.route
+        first, second = route[i], route[j]
+        previous = route[i - 1] if i > 0 else self.cost_model.start_ride
+        has_following = j + 1 < len(route)
+        following = route[j + 1] if has_following else 0
+
+        old = travel[previous][first]
+        new = travel[previous][second]
+        if j == i + 1:
+            old += travel[first][second]
+            new += travel[second][first]
+        else:
+            after_first, before_second = route[i + 1], route[j - 1]
+            old += travel[first][after_first] + travel[before_second][second]
+            new += travel[second][after_first] + travel[before_second][first]
+        if has_following:
+            old += travel[second][following]
+            new += travel[first][following]
+        return new - old
+
+    def remove_delta(self, i: int) -> float:
+        if self.cost_model.time_dependent and self._flat_from:
+            return self._evaluated_delta(Move('remove', i, -1, self.route[i], 0.0))
+        travel = self.cost_model.travel_list
+        route = self.route
+        ride = route[i]
+        previous = route[i - 1] if i > 0 else self.cost_model.start_ride
+        delta = -(travel[previous][ride] + self.cost_model.duration_list[ride])
+        if self.cost_model.time_dependent:
+            delta -= self.cost_model.wait(ride, 0.0)
+        if i + 1 < len(route):
+            following = route[i + 1]
+            delta += travel[previous][following] - travel[ride][following]
+        return delta
+
+    def reverse_delta(self, i: int, j: int) -> float:
+        if self.cost_model.time_dependent and self._flat_from:
+            return self._evaluated_delta(Move('reverse', i, j, -1, 0.0))
+        travel = self.cost_model.travel_list
+        route = self.route
+        if self._walks is None:
+            forward, backward = [0.0], [0.0]
+            for current_ride, next_ride in zip(route, route[1:]):
+                forward.append(forward[-1] + travel[current_ride][next_ride])
+                backward.append(backward[-1] + travel[next_ride][current_ride])
+            self._walks = forward, backward
+        forward, backward = self._walks
+        first, last = route[i], route[j]
+        previous = route[i - 1] if i > 0 else self.cost_model.start_ride
+        # Walks inside the segment switch direction; durations don't change
+        old = travel[previous][first] + forward[j] - forward[i]
+        new = travel[previous][last] + backward[j] - backward[i]
+        if j + 1 < len(route):
+            following = route[j + 1]
+            old += travel[last][following]
+            new += travel[first][following]
+        return new - old
+
+    def batch_deltas(self, moves: Sequence[Move]) -> np.ndarray:
+        """Deltas of ``moves``, scored in one batched pass over the cost model."""
+        if not moves:
+            return np.zeros(0)
+        length = len(self.route)
+        # The moved routes as one padded array: each entry takes the ride at a source position
+        padded = np.array(self.route + [self.cost_model.start_ride], dtype=np.intp)
+        kind = np.array([move.kind for move in moves])[:, None]
+        i = np.array([move.i for move in moves])[:, None]
+        j = np.array([move.j for move in moves])[:, None]
+        columns = np.arange(length + 1)[None, :]
+        source = np.select(
+            [(kind == 'insert') & (columns > i), (kind == 'remove') & (columns >= i),
+             (kind == 'swap') & (columns == i), (kind == 'swap') & (columns == j),
+             (kind == 'reverse') & (columns >= i) & (columns <= j)],
+            [columns - 1, columns + 1, j, i, i + j - columns],
+            columns,
+        )
+        routes = padded[np.minimum(source, length)]
+        inserted = (kind == 'insert') & (columns == i)
+        routes = np.where(inserted, np.array([move.ride for move in moves])[:, None], routes)
+        lengths = length + inserted.any(axis=1) - (kind == 'remove')[:, 0]
+        return self.cost_model.total_times(routes, lengths) - self.total_time
+
+    def _evaluated_delta(self, move: Move) -> float:
+        # Rides before position i keep their finish times, so only the moved suffix is rescored
+        route = self.route
+        i = move.i
+        suffix = route[i:]
+        apply_move(suffix, move._replace(i=0, j=move.j - i))
+        previous = route[i - 1] if i > 0 else self.cost_model.start_ride
+        start = self.arrivals[i - 1] if i > 0 else 0.0
+        # First position the move leaves in place; the suffix ends with route[end:]
+        end = i if move.kind == 'insert' else i + 1 if move.kind == 'remove' else move.j + 1
+        if end < len(route) and end + 1 >= self._flat_from:
+            # Every ride after route[end] waits the same whenever it is reached, so the
+            # shift in route[end]'s finish carries unchanged to the end of the route
+            through_end = len(suffix) - (len(route) - end) + 1
+            return self.cost_model.continued_time(previous, start, suffix[:through_end]) - self.arrivals[end]
+        return self.cost_model.continued_time(previous, start, suffix) - self.total_time
+
+    def insert(self, ride: int, i: int) -> Move:
+        return Move('insert', i, -1, ride, self.insert_delta(ride, i))
+
+    def swap(self, i: int, j: int) -> Move:
+        return Move('swap', i, j, -1, self.swap_delta(i, j))
+
+    def reverse(self, i: int, j: int) -> Move:
+        return Move('reverse', i, j, -1, self.reverse_delta(i, j))
+
+    def remove(self, i: int) -> Move:
+        return Move('remove', i, -1, self.route[i], self.remove_delta(i))
+
+    def applied(self, move: Move) -> List[int]:
+        """The route that ``move`` would produce, leaving this state untouched."""
+        route = self.route.copy()
+        apply_move(route, move)
+        return route
+
+    def apply(self, move: Move):
+        apply_move(self.route, move)
+        self.refresh()
+
+
+def apply_move(route: List[int], move: Move):
+    """Apply ``move`` to ``route`` in place."""
+    if move.kind == 'insert':
+        route.insert(move.i, move.ride)
+    elif move.kind == 'swap':
+        route[move.i], route[move.j] = route[move.j], route[move.i]
+    elif move.kind == 'reverse':
+        route[move.i:move.j + 1] = route[move.i:move.j + 1][::-1]
+    elif move.kind == 'remove':
+        del route[move.i]
+    else:
+        raise ValueError(f"Unknown move kind: {move.kind}")
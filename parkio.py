@@ -0,0 +1,113 @@
+"""On-disk park format.
+
+A park file is a small JSON header followed by the travel matrix as one fixed-width,
+little-endian binary block, then the queue wait table if the park has one::
+
+    b'LUNAPARK' | version (uint32) | header length (uint32) | JSON header | padding | matrix
+        [| padding | wait table]
+
+Both blocks start on a 64-byte boundary, so :func:`load_park` can memory-map them
+read-only; every process that loads the same file then shares the pages instead of
+holding a copy.
+"""
+import json
+import struct
+
+import numpy as np
+
+from queues import QueueModel
+from util import ParkData
+
+MAGIC = b'LUNAPARK'
+# Version 2 added the queue wait table; version 1 files are still read
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct('<8sII')
+
+
+def _matrix_dtype(travel: np.ndarray) -> np.dtype:
+    """Smallest fixed-width dtype that stores the travel matrix exactly."""
+    if travel.size and np.array_equal(travel, np.round(travel)) and travel.min() >= 0:
+        if travel.max() <= np.iinfo(np.uint16).max:
+            return np.dtype('<u2')
+        if travel.max() <= np.iinfo(np.uint32).max:
+            return np.dtype('<u4')
+    return np.dtype('<f8')
+
+
+def save_park(park_data: ParkData, path: str):
+    travel = np.asarray(park_data.travel_times)
+    dtype = _matrix_dtype(travel)
+    header = {
+        'park_name': park_data.park_name,
+        'ride_times': [int(ride_time) for ride_time in park_data.ride_times],
+        'ride_categories': list(park_data.ride_categories),
+        'category_time_addition': park_data.category_time_addition,
+        'day_category_affect': park_data.day_category_affect,
+        'travel_dtype': dtype.str,
+        'travel_shape': list(travel.shape),
+    }
+    queue_model = park_data.queue_model
+    if queue_model is not None:
+        # The table's second axis is the model's horizon in minutes
+        header['queue_dtype'] = np.dtype('<f8').str
+        header['queue_shape'] = list(queue_model.table.shape)
+    encoded = json.dumps(header).encode('utf-8')
+    offset = _PREAMBLE.size + len(encoded)
+    padding = -offset % ALIGNMENT
+
+    with open(path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, len(encoded)))
+        f.write(encoded)
+        f.write(b'\0' * padding)
+        f.write(np.ascontiguousarray(travel, dtype=dtype).tobytes())
+        if queue_model is not None:
+            f.write(b'\0' * (-f.tell() % ALIGNMENT))
+            f.write(np.ascontiguousarray(queue_model.table, dtype=header['queue_dtype']).tobytes())
+
+
+def read_header(path: str):
+    """Return (header, matrix offset) of a park file."""
+    with open(path, 'rb') as f:
+        magic, version, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a park file.")
+        if version not in SUPPORTED_VERSIONS:
+            raise ValueError(f"Unsupported park file version {version} in {path}.")
+        header = json.loads(f.read(header_length).decode('utf-8'))
+    offset = _PREAMBLE.size + header_length
+    return header, offset + (-offset % ALIGNMENT)
+
+
+def load_park(path: str, mmap: bool = True) -> ParkData:
+    """Load a park saved by :func:`save_park`.
+
+    With ``mmap`` the travel matrix and any queue wait table are read-only ``np.memmap``
+    arrays in their stored dtypes, otherwise they are read into memory.
+    """
+    header, offset = read_header(path)
+    travel = _read_block(path, header['travel_dtype'], header['travel_shape'], offset, mmap)
+    queue_model = None
+    if 'queue_shape' in header:
+        offset += travel.nbytes
+        offset += -offset % ALIGNMENT
+        queue_model = QueueModel.from_table(_read_block(path, header['queue_dtype'], header['queue_shape'], offset,
+                                                        mmap))
+    return ParkData.from_components(
+        header['park_name'],
+        header['ride_times'],
+        travel,
+        header['ride_categories'],
+        header['category_time_addition'],
+        header['day_category_affect'],
+        queue_model=queue_model,
+    )
+
+
+def _read_block(path: str, dtype: str, shape, offset: int, mmap: bool) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    shape = tuple(shape)
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+    return np.fromfile(path, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
@@ -0,0 +1,89 @@
+"""Time-dependent queue waits.
+
+Each ride has a piecewise-linear wait curve over the minutes of the day. The curves are
+tabulated once into a (rides x minutes) array, so looking up the wait for a ride at an
+arrival time is a single index instead of an interpolation.
+"""
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+from util import OPENING_MINUTE
+
+MINUTES_PER_DAY = 24 * 60
+CLOSING_MINUTE = 21 * 60
+
+
+class QueueModel:
+    """Per-ride wait curves, tabulated per minute of the day.
+
+    ``curves`` maps a ride to ``(minutes, waits)`` breakpoints of its wait curve; between
+    breakpoints the wait is interpolated linearly and outside them it is held at the end
+    values. Rides without a curve never wait. Arrival times are floored to the minute
+    and clamped to ``[0, horizon)``.
+    """
+
+    def __init__(self, num_rides: int, curves: Dict[int, Tuple[Sequence[float], Sequence[float]]],
+                 horizon: int = MINUTES_PER_DAY):
+        self.num_rides = num_rides
+        self.horizon = horizon
+        self.table = np.zeros((num_rides, horizon))
+        minutes = np.arange(horizon)
+        for ride, (breakpoints, waits) in curves.items():
+            if np.any(np.diff(breakpoints) <= 0):
+                raise ValueError(f"Wait curve breakpoints of ride {ride} must be strictly increasing.")
+            if np.any(np.asarray(waits) < 0):
+                raise ValueError(f"Wait curve of ride {ride} has a negative wait.")
+            self.table[ride] = np.interp(minutes, breakpoints, waits)
+        self._summarize()
+
+    @classmethod
+    def from_table(cls, table: np.ndarray) -> "QueueModel":
+        """Model over an already tabulated (rides x minutes) wait table, such as one read from a park file."""
+        model = cls.__new__(cls)
+        model.num_rides, model.horizon = table.shape
+        model.table = table
+        model._summarize()
+        return model
+
+    def _summarize(self):
+        self.min_waits = self.table.min(axis=1)
+        # Rides whose wait is the same all day, such as rides without a curve
+        self.flat = self.min_waits == self.table.max(axis=1)
+        self._fifo = None
+
+    @classmethod
+    def random(cls, num_rides: int, rng: np.random.Generator = None, opening: int = OPENING_MINUTE,
+               closing: int = CLOSING_MINUTE, max_wait: float = 45) -> "QueueModel":
+        """A curve per ride that ramps from a short wait at opening up to a random midday peak and back."""
+        rng = rng if rng is not None else np.random.default_rng()
+        peaks = rng.integers(opening + 60, closing - 60, size=num_rides)
+        peak_waits = np.rint(rng.random(num_rides) * max_wait)
+        base_waits = np.rint(peak_waits * rng.random(num_rides) * 0.3)
+        curves = {
+            ride: ((opening, int(peaks[ride]), closing), (base_waits[ride], peak_waits[ride], base_waits[ride]))
+            for ride in range(num_rides)
+        }
+        return cls(num_rides, curves)
+
+    def minute_index(self, minutes):
+        """Table column of each clock minute."""
+        # Truncation is flooring once clipped at zero
+        return np.clip(minutes, 0, self.horizon - 1).astype(np.intp)
+
+    def wait(self, ride: int, minute: float) -> float:
+        return float(self.table[ride, self.minute_index(minute)])
+
+    def waits(self, rides, minutes) -> np.ndarray:
+        """Waits for arrays of rides and arrival minutes, broadcast together."""
+        return self.table[rides, self.minute_index(minutes)]
+
+    def is_fifo(self) -> bool:
+        """True if, at whole-minute arrivals, arriving later never means finishing earlier.
+
+        The exact and branch-and-bound solvers keep only the earliest finish per state, which
+        is only optimal under this condition, so they refuse models without it.
+        """
+        if self._fifo is None:
+            self._fifo = bool(np.all(np.diff(self.table, axis=1) >= -1))
+        return self._fifo
@@ -0,0 +1,81 @@
+"""Re-planning the rest of a visit that is under way.
+
+When a ride closes or the visitor falls behind, the route still ahead is repaired from
+where the visitor stands instead of being planned again from the entrance: rides that
+can no longer be taken are dropped, the part that no longer fits is cut off using the
+route's prefix times, and the time freed is refilled by cheapest insertion. An
+optimizer can then polish the repaired route, warm-started from it.
+"""
+from typing import Iterable, List, Sequence
+
+from cost import RouteCostModel
+from moves import EPSILON, RouteState
+from runner import WARM_START_EFFORT, RouteResult, build_optimizer
+from util import ParkData, UserData
+
+
+def repair_route(cost_model: RouteCostModel, route: Sequence[int], candidates: Sequence[int],
+                 time_limit: float) -> List[int]:
+    """``route`` cut to the part that fits ``time_limit``, then filled by cheapest insertion of ``candidates``."""
+    state = RouteState(cost_model, route)
+    fitting = sum(1 for finish in state.arrivals if finish <= time_limit + EPSILON)
+    if fitting < len(state.route):
+        state.route = state.route[:fitting]
+        state.refresh()
+
+    missing = [ride for ride in dict.fromkeys(candidates) if ride not in set(state.route)]
+    while missing:
+        best = None
+        for ride in missing:
+            for position in range(len(state.route) + 1):
+                move = state.insert(ride, position)
+                if state.total_time + move.delta <= time_limit + EPSILON and (best is None or move.delta < best.delta):
+                    best = move
+        if best is None:
+            break
+        state.apply(best)
+        missing.remove(best.ride)
+    return state.route
+
+
+def replan(park_data: ParkData, user_data: UserData, current_ride: int, elapsed: float,
+           remaining_route: Sequence[int], visited_rides: Iterable[int] = (), closed_rides: Iterable[int] = (),
+           algorithm: str = None, cost_model: RouteCostModel = None, cache=None) -> RouteResult:
+    """Route for the rest of a visit, standing at ``current_ride`` ``elapsed`` minutes in.
+
+    ``remaining_route`` is what is left of the current plan. Desired rides not in
+    ``visited_rides`` or ``closed_rides`` may be added back. Without ``algorithm`` the
+    repaired route is returned as is; otherwise that optimizer is run from it with the
+    reduced effort of a warm start. ``cost_model`` (or ``cache``, a ``ParkCache``) saves
+    rebuilding the park's costs. The result's ``total_time`` counts from now.
+    """
+    if cost_model is None:
+        if cache is not None:
+            cost_model = cache.get(park_data, user_data.visit_day, user_data.start_minute)
+        else:
+            cost_model = RouteCostModel.from_data(park_data, user_data)
+    cost_model = cost_model.resumed(current_ride, elapsed)
+    time_left = user_data.total_time_available - elapsed
+
+    excluded = set(visited_rides) | set(closed_rides) | {current_ride}
+    candidates = [ride for ride in dict.fromkeys([*remaining_route, *user_data.desired_rides])
+                  if ride not in excluded]
+    route = repair_route(cost_model, [ride for ride in remaining_route if ride not in excluded], candidates,
+                         time_left)
+    best = RouteResult(route, len(route), cost_model.route_time(route))
+    if algorithm is None or not candidates:
+        return best
+
+    remaining_user = UserData(None, candidates, time_left, user_data.visit_day, user_data.start_minute + elapsed)
+    optimizer = build_optimizer(algorithm, park_data, remaining_user, cost_model, cache)
+    if hasattr(optimizer, 'initial_solutions') and route:
+        optimizer.initial_solutions = [route]
+        for attribute, value in WARM_START_EFFORT.get(algorithm, {}).items():
+            setattr(optimizer, attribute, value)
+    optimizer.run()
+    path = list(optimizer.path)
+    # Priced on the path itself, as some optimizers report the time they ran out at
+    total_time = cost_model.route_time(path)
+    if (len(path), -total_time) > (best.num_rides, -best.total_time):
+        best = RouteResult(path, len(path), total_time)
+    return best
@@ -0,0 +1,142 @@
+"""Monte Carlo robustness of routes under random ride and walking times.
+
+Routes are planned on deterministic times. ``RobustnessEvaluator`` replays a route under
+thousands of sampled perturbations (lognormal factors on every ride duration and walk,
+and on queue waits when the park has them) and reports how likely it is to finish in
+time. Samples are drawn and reduced in chunks, so memory stays at one chunk however
+many samples are requested. ``chance_constrained_route`` plans against a tightened
+budget so the route meets the real one with a given probability.
+"""
+import random
+from typing import NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from cost import RouteCostModel
+from runner import RouteResult, build_optimizer
+from util import ParkData, UserData
+
+
+class RobustnessReport(NamedTuple):
+    samples: int
+    on_time_probability: float
+    mean: float
+    p50: float
+    p95: float
+
+
+def lognormal_factors(rng: np.random.Generator, cv: float, shape) -> np.ndarray:
+    """Multiplicative noise with mean 1 and coefficient of variation ``cv``."""
+    if cv <= 0:
+        return np.ones(shape)
+    sigma = np.sqrt(np.log1p(cv * cv))
+    return rng.lognormal(-sigma * sigma / 2, sigma, size=shape)
+
+
+class RobustnessEvaluator:
+    """Sampled finish times of a route and their summary, computed chunk by chunk.
+
+    ``duration_cv``, ``travel_cv`` and ``wait_cv`` are the coefficients of variation of
+    ride durations (including the day's delay), walks and queue waits. Quantiles come
+    from a fixed histogram of ``bins`` bins up to ``horizon_factor`` times the planned
+    route time, accurate to one bin width.
+    """
+
+    def __init__(self, cost_model: RouteCostModel, time_limit: float, duration_cv: float = 0.2,
+                 travel_cv: float = 0.1, wait_cv: float = 0.3, num_samples: int = 10000, chunk_size: int = 2048,
+                 bins: int = 2048, horizon_factor: float = 3.0, rng: np.random.Generator = None):
+        self.cost_model = cost_model
+        self.time_limit = time_limit
+        self.duration_cv = duration_cv
+        self.travel_cv = travel_cv
+        self.wait_cv = wait_cv
+        self.num_samples = num_samples
+        self.chunk_size = chunk_size
+        self.bins = bins
+        self.horizon_factor = horizon_factor
+        # Drawn from the global random state so seeding random keeps evaluations reproducible
+        self.rng = rng if rng is not None else np.random.default_rng(random.getrandbits(64))
+
+    def sample_finish_times(self, route: Sequence[int], size: int) -> np.ndarray:
+        """Finish times of ``route`` under ``size`` sampled perturbations."""
+        cost_model = self.cost_model
+        route = np.asarray(route, dtype=np.intp)
+        previous = np.concatenate(([cost_model.start_ride], route[:-1]))
+        walks = cost_model.travel[previous, route] * lognormal_factors(self.rng, self.travel_cv, (size, len(route)))
+        rides = cost_model.durations[route] * lognormal_factors(self.rng, self.duration_cv, (size, len(route)))
+        if not cost_model.time_dependent:
+            return (walks + rides).sum(axis=1)
+        # Waits depend on when each ride is reached, so step through the route
+        wait_factors = lognormal_factors(self.rng, self.wait_cv, (size, len(route)))
+        finish = np.zeros(size)
+        for position, ride in enumerate(route.tolist()):
+            reached = finish + walks[:, position]
+            finish = reached + cost_model.waits(ride, reached) * wait_factors[:, position] + rides[:, position]
+        return finish
+
+    def evaluate(self, route: Sequence[int]) -> RobustnessReport:
+        if not len(route):
+            return RobustnessReport(self.num_samples, 1.0, 0.0, 0.0, 0.0)
+        horizon = self.horizon_factor * max(self.cost_model.route_time(route), self.time_limit)
+        edges = np.linspace(0.0, horizon, self.bins + 1)
+        counts = np.zeros(self.bins + 1, dtype=np.int64)  # the last bin counts overflow
+        on_time = 0
+        total = 0.0
+        for start in range(0, self.num_samples, self.chunk_size):
+            finish = self.sample_finish_times(route, min(self.chunk_size, self.num_samples - start))
+            on_time += int(np.count_nonzero(finish <= self.time_limit))
+            total += float(finish.sum())
+            counts += np.bincount(np.minimum((finish / horizon * self.bins).astype(np.intp), self.bins),
+                                  minlength=self.bins + 1)
+        cumulative = np.cumsum(counts)
+        return RobustnessReport(
+            self.num_samples,
+            on_time / self.num_samples,
+            total / self.num_samples,
+            self._quantile(cumulative, edges, 0.50),
+            self._quantile(cumulative, edges, 0.95),
+        )
+
+    def _quantile(self, cumulative: np.ndarray, edges: np.ndarray, q: float) -> float:
+        target = q * self.num_samples
+        index = int(np.searchsorted(cumulative, target))
+        if index >= self.bins:
+            return float('inf')
+        below = cumulative[index - 1] if index else 0
+        in_bin = cumulative[index] - below
+        # Linear within the bin
+        fraction = (target - below) / in_bin if in_bin else 0.0
+        return float(edges[index] + fraction * (edges[index + 1] - edges[index]))
+
+
+def chance_constrained_route(algorithm: str, park_data: ParkData, user_data: UserData, confidence: float = 0.95,
+                             rounds: int = 6, **evaluator_kwargs) -> Tuple[RouteResult, RobustnessReport]:
+    """Route that finishes within the user's time with probability at least ``confidence``.
+
+    The optimizer is rerun on a planning budget found by bisection between zero and the
+    real one: the largest tried budget whose route meets the confidence wins. Returns
+    the route (its ``total_time`` is the deterministic one) and its report.
+    """
+    cost_model = RouteCostModel.from_data(park_data, user_data)
+    evaluator = RobustnessEvaluator(cost_model, user_data.total_time_available, **evaluator_kwargs)
+    best = (RouteResult([], 0, 0), evaluator.evaluate([]))
+    low, high = 0.0, float(user_data.total_time_available)
+    budget = high
+    for _ in range(rounds):
+        planning_user = UserData(None, user_data.desired_rides, budget, user_data.visit_day, user_data.start_minute)
+        optimizer = build_optimizer(algorithm, park_data, planning_user, cost_model)
+        optimizer.run()
+        route = list(optimizer.path)
+        # Priced on the route itself, as some optimizers report the time they ran out at
+        total_time = cost_model.route_time(route)
+        report = evaluator.evaluate(route)
+        if report.on_time_probability >= confidence:
+            if (len(route), -total_time) > (best[0].num_rides, -best[0].total_time):
+                best = (RouteResult(route, len(route), total_time), report)
+            if budget == high:
+                break
+            low = budget
+        else:
+            high = budget
+        budget = (low + high) / 2
+    return best
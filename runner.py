@@ -0,0 +1,196 @@
+import inspect
+import math
+import random
+import time
+from functools import lru_cache
+from importlib import import_module
+from typing import List, NamedTuple, Tuple, TYPE_CHECKING
+
+from util import ParkData, UserData
+
+if TYPE_CHECKING:
+    from cache import ParkCache
+    from cost import RouteCostModel
+    from instrument import Profile
+    from memo import RouteCache
+
+# Order matches the tuples returned by run_optimization_algorithms in main.py
+ALGORITHMS = ('hill', 'genetic', 'greedy', 'exact')
+
+# Algorithm name -> (module, class). Modules are imported on first use, so a run of one
+# algorithm only pays for that optimizer's imports.
+OPTIMIZERS = {
+    'greedy': ('greedy', 'GreedyAmusementParkOptimizer'),
+    'hill': ('hill', 'HillClimbParkOptimizer'),
+    'genetic': ('cat', 'GeneticAlgorithm'),
+    'genetic_vec': ('vector_ga', 'VectorizedGeneticAlgorithm'),
+    'exact': ('exact', 'ExactDPOptimizer'),
+    'bnb': ('bnb', 'BranchAndBoundOptimizer'),
+    'anneal': ('anneal', 'SimulatedAnnealingOptimizer'),
+}
+
+# Optimizers taking GeneticAlgorithm's argument order
+GENETIC_ALGORITHMS = ('genetic', 'genetic_vec')
+
+# Effort settings for optimizers seeded with a greedy route. The seeded GAs match or beat
+# their unseeded quality in a third of the generations; hill climbing keeps its restarts,
+# as fewer of them lost rides on the benchmark corpus even with the greedy seed
+WARM_START_EFFORT = {
+    'hill': {},
+    'anneal': {},
+    'genetic': {'generations': 10},
+    'genetic_vec': {'generations': 10},
+}
+
+
+class RouteResult(NamedTuple):
+    path: List[int]
+    num_rides: int
+    total_time: float
+
+
+def optimizer_class(algorithm: str):
+    if algorithm not in OPTIMIZERS:
+        raise ValueError(f"Unknown algorithm: {algorithm}")
+    module_name, class_name = OPTIMIZERS[algorithm]
+    return getattr(import_module(module_name), class_name)
+
+
+@lru_cache(maxsize=None)
+def is_anytime(algorithm: str) -> bool:
+    """Whether the optimizer's ``run`` takes a ``time_budget`` and returns its best route within it."""
+    return 'time_budget' in inspect.signature(optimizer_class(algorithm).run).parameters
+
+
+def build_optimizer(algorithm: str, park_data: ParkData, user_data: UserData, cost_model: "RouteCostModel" = None,
+                    cache: "ParkCache" = None, warm_start: bool = False, initial_solutions: List[List[int]] = ()):
+    """Construct the named optimizer; with ``cache`` the park precomputation is shared.
+
+    With ``warm_start`` a greedy route is computed first and, with any ``initial_solutions``
+    (e.g. cached routes), seeds the hill-climbing restarts or the GA's initial population,
+    which then run with the reduced effort in ``WARM_START_EFFORT``.
+    """
+    if warm_start and algorithm in WARM_START_EFFORT:
+        if cost_model is None and cache is None:
+            # Shared by the greedy run and the seeded optimizer
+            from cost import RouteCostModel
+            cost_model = RouteCostModel.from_data(park_data, user_data)
+        greedy = build_optimizer('greedy', park_data, user_data, cost_model, cache)
+        greedy.run()
+        optimizer = build_optimizer(algorithm, park_data, user_data, cost_model, cache)
+        optimizer.initial_solutions = [route for route in [greedy.path, *initial_solutions] if route]
+        for attribute, value in WARM_START_EFFORT[algorithm].items():
+            setattr(optimizer, attribute, value)
+        return optimizer
+
+    optimizer = optimizer_class(algorithm)
+    if cache is not None:
+        if cost_model is None:
+            cost_model = cache.get(park_data, user_data.visit_day, user_data.start_minute)
+    elif cost_model is None and park_data.queue_model is not None:
+        # The optimizers' own cost models only know the static per-day delays
+        from cost import RouteCostModel
+        cost_model = RouteCostModel.from_data(park_data, user_data)
+    if algorithm in GENETIC_ALGORITHMS:
+        return optimizer(
+            park_data.ride_times,
+            park_data.travel_times,
+            park_data.ride_categories,
+            park_data.category_time_addition,
+            park_data.day_category_affect,
+            user_data.desired_rides,
+            user_data.visit_day,
+            user_data.total_time_available,
+            cost_model=cost_model
+        )
+    optimizer = optimizer(
+        user_data.desired_rides,
+        user_data.total_time_available,
+        park_data.ride_times,
+        park_data.travel_times,
+        park_data.ride_categories,
+        park_data.category_time_addition,
+        user_data.visit_day,
+        park_data.day_category_affect,
+        cost_model=cost_model,
+    )
+    if cache is not None and hasattr(optimizer, 'neighbor_index'):
+        from greedy import worth_indexing
+
+        # Greedy routes, including bnb's and anneal's greedy seeds, share the park's cached
+        # index, unless the list is short enough that scanning it is cheaper
+        if worth_indexing(len(set(user_data.desired_rides)), park_data.num_rides):
+            optimizer.neighbor_index = cache.neighbor_index(park_data)
+    return optimizer
+
+
+def run_algorithm(algorithm: str, park_data: ParkData, user_data: UserData, cost_model: "RouteCostModel" = None,
+                  profile: "Profile" = None, route_cache: "RouteCache" = None) -> Tuple[float, float, float]:
+    """Run one optimizer and return (rides, total time, computation time).
+
+    The exact solver is skipped with NaNs when the desired-ride set is too large for it.
+    With ``profile`` the run is instrumented and recorded under the algorithm's name.
+    With ``route_cache`` a repeated request is answered from the cache without building
+    an optimizer; a miss is computed (and profiled) as usual, then cached.
+    """
+    if route_cache is not None:
+        from memo import request_key
+
+        start_time = time.time()
+        key = request_key(algorithm, park_data, user_data)
+        result = route_cache.get(key)
+        if result is not None:
+            return result.num_rides, result.total_time, time.time() - start_time
+    optimizer = build_optimizer(algorithm, park_data, user_data, cost_model)
+    if algorithm == 'exact' and len(set(user_data.desired_rides)) > optimizer.max_rides:
+        return math.nan, math.nan, math.nan
+    start_time = time.time()
+    if route_cache is not None:
+        _, num_rides, total_time = route_cache.compute(key, optimizer, profile)
+    elif profile is not None:
+        num_rides, total_time = profile.run(optimizer, label=algorithm)
+    else:
+        num_rides, total_time = optimizer.run()
+    end_time = time.time()
+    return num_rides, total_time, end_time - start_time
+
+
+def job_seed(seed: int, park_index: int, algorithm: str) -> str:
+    """Per-job seed, so a job's result doesn't depend on which worker runs it or when."""
+    return f"{seed}:{park_index}:{algorithm}"
+
+
+def _run_job(park_index: int, algorithm: str, park_data: ParkData, user_data: UserData, seed: int):
+    random.seed(job_seed(seed, park_index, algorithm))
+    return park_index, algorithm, run_algorithm(algorithm, park_data, user_data)
+
+
+def run_simulations_parallel(park_names: List[str], park_user_data: List[Tuple[ParkData, UserData]],
+                             max_workers: int = None, seed: int = 0, algorithms=ALGORITHMS):
+    """Fan (park, algorithm) jobs out over a process pool.
+
+    Returns the same ``results`` dict as ``run_simulations`` in main.py, with entries
+    in park order. Every job is seeded from (seed, park, algorithm), so results are
+    reproducible for any ``max_workers``.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    num_parks = len(park_names)
+    results = {
+        algorithm: {'rides': [None] * num_parks, 'time': [None] * num_parks, 'complexity': [None] * num_parks}
+        for algorithm in algorithms
+    }
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_run_job, park_index, algorithm, park_data, user_data, seed)
+            for park_index, (park_data, user_data) in enumerate(park_user_data)
+            for algorithm in algorithms
+        ]
+        for future in as_completed(futures):
+            park_index, algorithm, (num_rides, total_time, comp_time) = future.result()
+            results[algorithm]['rides'][park_index] = num_rides
+            results[algorithm]['time'][park_index] = total_time
+            results[algorithm]['complexity'][park_index] = comp_time
+
+    return results
@@ -0,0 +1,235 @@
+"""In-process asyncio service for route requests.
+
+``RouteService`` accepts requests from any number of coroutines and solves them on a
+shared process pool, so concurrent callers neither block the event loop nor need a
+process each::
+
+    async with RouteService([park_data]) as service:
+        result = await service.optimize(park_data.park_name, user_data, deadline=0.5)
+
+Parks are registered up front and sent to each worker once (a park file path is
+memory-mapped instead). Identical in-flight requests share one computation, and a
+bounded queue makes callers wait when the pool falls behind.
+"""
+import asyncio
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from batch import _as_park
+from cache import ParkCache
+from memo import RouteCache, request_key
+from runner import OPTIMIZERS, RouteResult, build_optimizer, is_anytime
+from util import ParkData, UserData
+
+# Set in each service worker by _init_service_worker
+_worker_parks: Dict[str, ParkData] = {}
+_worker_cache: ParkCache = None
+
+
+def _init_service_worker(parks: Dict[str, Union[ParkData, str]]):
+    global _worker_parks, _worker_cache
+    _worker_parks = {park_name: _as_park(park) for park_name, park in parks.items()}
+    _worker_cache = ParkCache(max_parks=max(1, len(parks)))
+
+
+def _solve_request(park_name: str, algorithm: str, user_data: UserData, time_budget: Optional[float],
+                   seed: str) -> RouteResult:
+    random.seed(seed)
+    optimizer = build_optimizer(algorithm, _worker_parks[park_name], user_data, cache=_worker_cache)
+    if time_budget is not None:
+        num_rides, total_time = optimizer.run(time_budget=time_budget)
+    else:
+        num_rides, total_time = optimizer.run()
+    return RouteResult(optimizer.path, num_rides, total_time)
+
+
+class _Request:
+    """One computation shared by identical requests, with the latest deadline of their callers."""
+
+    def __init__(self, future: asyncio.Future, expires_at: Optional[float]):
+        self.future = future
+        # Loop time after which no caller waits any more; None while one waits without a deadline
+        self.expires_at = expires_at
+        # Loop time an anytime optimizer running the request returns by, None if it isn't running one
+        self.budget_ends_at: Optional[float] = None
+
+    def join(self, expires_at: Optional[float]):
+        if self.expires_at is not None:
+            self.expires_at = None if expires_at is None else max(self.expires_at, expires_at)
+
+    def cuts_short(self, expires_at: Optional[float]) -> bool:
+        """Whether the route would come back before a caller with this deadline needs it."""
+        return self.budget_ends_at is not None and (expires_at is None or expires_at > self.budget_ends_at)
+
+
+class RouteService:
+    """Asyncio front end over a process pool of optimizers.
+
+    ``parks`` are ``ParkData`` objects or paths of parks saved with ``parkio.save_park``,
+    addressed by park name. At most ``max_pending`` requests wait in the queue; further
+    callers wait in :meth:`optimize` until there is room. With ``route_cache`` repeated
+    requests are answered without reaching the pool.
+    """
+
+    def __init__(self, parks: Iterable[Union[ParkData, str]], algorithm: str = 'greedy', max_workers: int = None,
+                 max_pending: int = 1024, route_cache: RouteCache = None, seed: int = 0):
+        if algorithm not in OPTIMIZERS:
+            raise ValueError(f"Unknown algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.route_cache = route_cache
+        self.seed = seed
+        self.park_sources: Dict[str, Union[ParkData, str]] = {}
+        self.parks: Dict[str, ParkData] = {}
+        for park in parks:
+            park_data = _as_park(park)
+            self.park_sources[park_data.park_name] = park
+            self.parks[park_data.park_name] = park_data
+        self.submitted = 0
+        self.coalesced = 0
+        self.completed = 0
+        self._executor = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatchers = []
+        self._in_flight: Dict[Tuple, _Request] = {}
+        self._putting = set()
+
+    async def __aenter__(self) -> "RouteService":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def start(self):
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_service_worker,
+                                             initargs=(self.park_sources,))
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        # One dispatcher per worker keeps the pool busy without queueing work inside it
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.max_workers)]
+
+    async def close(self):
+        """Stop the workers; requests still queued or running are cancelled."""
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        for put in self._putting:
+            put.cancel()
+        if self._queue is not None:
+            while not self._queue.empty():
+                *_, request = self._queue.get_nowait()
+                request.future.cancel()
+            self._queue = None
+        for request in self._in_flight.values():
+            request.future.cancel()
+        self._in_flight.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def optimize(self, park_name: str, user_data: UserData, algorithm: str = None,
+                       deadline: float = None) -> RouteResult:
+        """Best route for ``user_data`` in the named park.
+
+        ``deadline`` is in seconds from now. Anytime optimizers get whatever is left of it
+        when a worker picks the request up and return the best route found by then. Any
+        other request not answered by its deadline raises ``asyncio.TimeoutError`` then;
+        a worker already running it finishes, but the result is dropped. A request
+        identical to one in flight shares its computation, which then runs to the latest
+        of their deadlines while each caller still times out at its own; an anytime run
+        that would return before this caller's deadline isn't shared.
+        """
+        if self._queue is None:
+            raise RuntimeError("RouteService is not started.")
+        algorithm = algorithm or self.algorithm
+        if park_name not in self.parks:
+            raise KeyError(f"Unknown park: {park_name}")
+        key = request_key(algorithm, self.parks[park_name], user_data)
+        self.submitted += 1
+
+        if self.route_cache is not None:
+            result = self.route_cache.get(key)
+            if result is not None:
+                return result
+
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + deadline if deadline is not None else None
+        request = self._in_flight.get(key)
+        if request is not None and not request.cuts_short(expires_at):
+            self.coalesced += 1
+            request.join(expires_at)
+            return await self._wait(request, park_name, expires_at)
+
+        request = _Request(loop.create_future(), expires_at)
+        self._in_flight[key] = request
+        # A task, so closing the service can cancel callers still waiting for room
+        put = asyncio.ensure_future(self._queue.put((key, park_name, algorithm, user_data, request)))
+        self._putting.add(put)
+        try:
+            await put
+        except BaseException:
+            # Cancelled while waiting for room; release any callers coalesced onto this request
+            self._release(key, request)
+            request.future.cancel()
+            raise
+        finally:
+            self._putting.discard(put)
+        return await self._wait(request, park_name, expires_at)
+
+    async def _wait(self, request: _Request, park_name: str, expires_at: Optional[float]) -> RouteResult:
+        if expires_at is None:
+            return await asyncio.shield(request.future)
+        timeout = expires_at - asyncio.get_running_loop().time()
+        try:
+            return await asyncio.wait_for(asyncio.shield(request.future), timeout)
+        except asyncio.TimeoutError:
+            if request.budget_ends_at is None or request.budget_ends_at > expires_at:
+                raise asyncio.TimeoutError(f"Request for {park_name} missed its deadline.") from None
+        # An anytime optimizer working to this deadline returns its best route right after it
+        return await asyncio.shield(request.future)
+
+    def _release(self, key: Tuple, request: _Request):
+        # Only if the key still refers to this request, not a newer one for the same key
+        if self._in_flight.get(key) is request:
+            del self._in_flight[key]
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            key, park_name, algorithm, user_data, request = await self._queue.get()
+            future = request.future
+            expires_at = request.expires_at
+            if future.done() or (expires_at is not None and expires_at <= loop.time()):
+                # Cancelled, or every caller's deadline passed while it was queued
+                future.cancel()
+                self._release(key, request)
+                self._queue.task_done()
+                continue
+            try:
+                time_budget = None
+                if expires_at is not None and is_anytime(algorithm):
+                    time_budget = expires_at - loop.time()
+                    request.budget_ends_at = expires_at
+                # Seeded by the request, so equal requests get equal routes whichever worker runs them
+                seed = f"{self.seed}:{key}"
+                result = await loop.run_in_executor(self._executor, _solve_request, park_name, algorithm,
+                                                    user_data, time_budget, seed)
+                if self.route_cache is not None and time_budget is None:
+                    # Routes cut short by a deadline aren't the algorithm's full answer, so aren't cached
+                    self.route_cache.put(key, result)
+                self.completed += 1
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+            finally:
+                self._release(key, request)
+                self._queue.task_done()
@@ -1,16 +1,110 @@
 import random
+from collections.abc import Sequence
 from typing import List, Dict
 
+import numpy as np
+
+CATEGORIES = ['Family', 'Thrill', 'Adventure', 'Adults', 'Food', 'No Shelter', 'Maintenance']
+DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+OPENING_MINUTE = 9 * 60
+
+
+class CategoryCodes(Sequence):
+    """Ride categories stored as small integer codes into a shared table of category names.
+
+    Reads like a list of strings, so code written against ``ride_categories`` keeps working.
+    """
+
+    def __init__(self, codes: np.ndarray, table: List[str]):
+        self.codes = codes
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.table[code] for code in self.codes[index]]
+        return self.table[self.codes[index]]
+
+    def code(self, category: str) -> int:
+        """Code of ``category``, or -1 if it is not in the table."""
+        return self.table.index(category) if category in self.table else -1
+
 
 class ParkData:
-    def __init__(self, park_name: str, num_rides: int):
+    def __init__(self, park_name: str, num_rides: int, compact: bool = False, walkways: bool = False):
         self.num_rides = num_rides
         self.park_name: str = park_name
-        self.ride_times: List[int] = self._generate_ride_times(num_rides)
-        self.travel_times: List[List[int]] = self._generate_travel_times(num_rides)
-        self.ride_categories: List[str] = self._generate_ride_categories(num_rides)
+        if walkways:
+            # Travel times are shortest walks over a random walkway graph instead of independent draws
+            from graph import WalkwayGraph
+            self.walkway_graph = WalkwayGraph.random(num_rides, rng=np.random.default_rng(random.getrandbits(64)))
+            travel_times = self.walkway_graph.ride_travel_times()
+            self.travel_times = travel_times.astype(np.uint16) if compact else travel_times.tolist()
+        if compact:
+            # Arrays drawn from a generator seeded off the global state, so seeding random still applies
+            rng = np.random.default_rng(random.getrandbits(64))
+            self.ride_times = rng.integers(3, 21, size=num_rides, dtype=np.uint16)
+            if not walkways:
+                self.travel_times = rng.integers(3, 16, size=(num_rides, num_rides), dtype=np.uint16)
+                np.fill_diagonal(self.travel_times, 0)
+            self.ride_categories = CategoryCodes(
+                rng.integers(len(CATEGORIES), size=num_rides, dtype=np.uint8), CATEGORIES)
+        else:
+            self.ride_times: List[int] = self._generate_ride_times(num_rides)
+            if not walkways:
+                self.travel_times: List[List[int]] = self._generate_travel_times(num_rides)
+            self.ride_categories: List[str] = self._generate_ride_categories(num_rides)
         self.category_time_addition: Dict[str, int] = self._generate_category_time_addition()
         self.day_category_affect: Dict[str, str] = self._generate_day_category_affect()
+        # Optional queues.QueueModel of time-dependent waits on top of the day's delays
+        self.queue_model = None
+
+    @property
+    def compact(self) -> bool:
+        return isinstance(self.ride_categories, CategoryCodes)
+
+    def to_compact(self) -> "ParkData":
+        """This park with typed arrays for rides and travel and coded categories.
+
+        Integer travel times are narrowed to uint16 when they fit; arrays that already have
+        that dtype, such as a memory-mapped matrix, are kept without a copy.
+        """
+        travel = np.asarray(self.travel_times)
+        if travel.size and np.array_equal(travel, np.round(travel)) and 0 <= travel.min() \
+                and travel.max() <= np.iinfo(np.uint16).max:
+            travel = travel.astype(np.uint16, copy=False)
+        ride_categories = self.ride_categories
+        if not isinstance(ride_categories, CategoryCodes):
+            table = CATEGORIES + sorted(set(ride_categories) - set(CATEGORIES))
+            ride_categories = CategoryCodes(
+                np.array([table.index(category) for category in ride_categories], dtype=np.uint8), table)
+        return ParkData.from_components(
+            self.park_name,
+            np.asarray(self.ride_times, dtype=np.uint16),
+            travel,
+            ride_categories,
+            self.category_time_addition,
+            self.day_category_affect,
+            self.queue_model,
+        )
+
+    @classmethod
+    def from_components(cls, park_name: str, ride_times: List[int], travel_times, ride_categories: List[str],
+                        category_time_addition: Dict[str, int], day_category_affect: Dict[str, str],
+                        queue_model=None) -> "ParkData":
+        """Build a park from known data instead of generating it randomly."""
+        park_data = cls.__new__(cls)
+        park_data.num_rides = len(ride_times)
+        park_data.park_name = park_name
+        park_data.ride_times = ride_times
+        park_data.travel_times = travel_times
+        park_data.ride_categories = ride_categories
+        park_data.category_time_addition = category_time_addition
+        park_data.day_category_affect = day_category_affect
+        park_data.queue_model = queue_model
+        return park_data
 
     def _generate_ride_times(self, num_rides: int) -> List[int]:
         return [random.randint(3, 20) for _ in range(num_rides)]
@@ -19,8 +113,7 @@ class ParkData:
         return [[random.randint(3, 15) if i != j else 0 for j in range(num_rides)] for i in range(num_rides)]
 
     def _generate_ride_categories(self, num_rides: int) -> List[str]:
-        categories = ['Family', 'Thrill', 'Adventure', 'Adults', 'Food', 'No Shelter', 'Maintenance']
-        return [random.choice(categories) for _ in range(num_rides)]
+        return [random.choice(CATEGORIES) for _ in range(num_rides)]
 
     def _generate_category_time_addition(self) -> Dict[str, int]:
         return {
@@ -34,9 +127,7 @@ class ParkData:
         }
 
     def _generate_day_category_affect(self) -> Dict[str, str]:
-        days_of_week = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-        categories = ['Family', 'Thrill', 'Adventure', 'Adults', 'Food', 'No Shelter', 'Maintenance']
-        return {day: random.choice(categories) for day in days_of_week}
+        return {day: random.choice(CATEGORIES) for day in DAYS}
 
     def print_data(self):
         print(f"--- {self.park_name} Data ---")
@@ -50,7 +141,9 @@ class ParkData:
 
 class UserData:
     def __init__(self, num_rides: int = None, desired_rides: List[int] = None, total_time_available: int = None,
-                 visit_day: str = None):
+                 visit_day: str = None, start_minute: int = OPENING_MINUTE):
+        # Clock minute the visit starts at; only matters for parks with a queue model
+        self.start_minute = start_minute
         if desired_rides is not None and total_time_available is not None and visit_day is not None:
             # User has provided all required data
             self.desired_rides = desired_rides
@@ -62,8 +155,7 @@ class UserData:
                 raise ValueError("num_rides must be provided to generate random data.")
             self.desired_rides = self._generate_desired_rides(num_rides)
             self.total_time_available = random.randint(10, 50)
-            self.visit_day = random.choice(
-                ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'])
+            self.visit_day = random.choice(DAYS)
 
     def _generate_desired_rides(self, num_rides: int) -> List[int]:
         num_desired_rides = random.randint(1, num_rides)
@@ -76,8 +168,8 @@ class UserData:
         print()
 
 
-def generate_park_data(park_name: str, num_rides: int) -> ParkData:
-    return ParkData(park_name, num_rides)
+def generate_park_data(park_name: str, num_rides: int, compact: bool = False, walkways: bool = False) -> ParkData:
+    return ParkData(park_name, num_rides, compact, walkways)
 
 
 def generate_user_data(num_rides: int) -> UserData:
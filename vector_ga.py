@@ -0,0 +1,158 @@
+import random
+from typing import List, Tuple
+
+import numpy as np
+
+from anytime import Deadline, ImprovementCallback, Incumbent
+from cost import RouteCostModel
+
+
+class VectorizedGeneticAlgorithm:
+    """NumPy backend for the genetic algorithm in cat.py.
+
+    The population is a 2-D array of ride permutations plus a length vector: each
+    chromosome is the permutation's longest prefix that fits in the time limit. Fitness,
+    selection, order crossover and swap mutation all work on the whole population at
+    once, so population sizes in the thousands stay cheap.
+    """
+
+    def __init__(self, ride_durations, travel_times, ride_categories, category_delays, day_category_effects,
+                 desired_rides, day, time_limit, cost_model=None, population_size=1000):
+        self.ride_durations = ride_durations
+        self.travel_times = travel_times
+        self.ride_categories = ride_categories
+        self.category_delays = category_delays
+        self.day_category_effects = day_category_effects
+        self.desired_rides = desired_rides
+        self.day = day
+        self.time_limit = time_limit
+        self.population_size = population_size
+        self.generations = 30
+        self.mutation_rate = 0.05
+        # Routes to seed part of the initial population with, e.g. a greedy or cached route
+        self.initial_solutions: List[List[int]] = []
+        self.seed_fraction = 0.25
+        self.path = []
+        self.total_time = 0
+        # Called as observer(event, **values) with convergence events, see instrument.Profile
+        self.observer = None
+        if cost_model is None:
+            cost_model = RouteCostModel(ride_durations, travel_times, ride_categories, category_delays, day,
+                                        day_category_effects)
+        self.cost_model = cost_model
+        self.rides = np.asarray(list(dict.fromkeys(desired_rides)), dtype=np.intp)
+
+    def evaluate(self, population: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return (lengths, total times, scores) for every chromosome in one pass.
+
+        The score ranks by rides visited and then by shorter time, like the (rides, -time)
+        tuples the other optimizers compare.
+        """
+        arrivals = self.cost_model.route_times(self.rides[population])
+        # Finish times only grow along a route, so the feasible part is a prefix
+        lengths = (arrivals <= self.time_limit).sum(axis=1)
+        last = np.maximum(lengths - 1, 0)
+        times = np.where(lengths > 0, arrivals[np.arange(len(population)), last], 0.0)
+        scores = lengths - times / (self.time_limit + 1)
+        return lengths, times, scores
+
+    def generate_population(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        population = rng.permuted(np.tile(np.arange(len(self.rides)), (size, 1)), axis=1)
+        if self.initial_solutions:
+            num_seeded = int(size * self.seed_fraction)
+            position = {ride: index for index, ride in enumerate(self.rides.tolist())}
+            seeds = [[position[ride] for ride in dict.fromkeys(route) if ride in position]
+                     for route in self.initial_solutions]
+            for row in range(num_seeded):
+                seed = seeds[row % len(seeds)]
+                # The seed's rides go first; the rest keep the row's random order
+                rest = population[row][~np.isin(population[row], seed)]
+                population[row] = np.concatenate((np.asarray(seed, dtype=population.dtype), rest))
+        return population
+
+    def selection(self, rng: np.random.Generator, lengths: np.ndarray, size: int) -> np.ndarray:
+        """Roulette-wheel selection on rides visited, as in cat.py; returns parent indices."""
+        total_fitness = lengths.sum()
+        if total_fitness == 0:
+            return rng.integers(len(lengths), size=size)
+        return rng.choice(len(lengths), size=size, p=lengths / total_fitness)
+
+    @staticmethod
+    def crossover(rng: np.random.Generator, parents1: np.ndarray, parents2: np.ndarray) -> np.ndarray:
+        """Order crossover (OX) for every row at once.
+
+        Each child keeps a random segment of its first parent in place and fills the other
+        positions with the remaining genes in the order they appear in the second parent.
+        """
+        num_children, size = parents1.shape
+        bounds = np.sort(rng.integers(size, size=(num_children, 2)), axis=1)
+        start, end = bounds[:, :1], bounds[:, 1:] + 1
+        positions = np.arange(size)
+
+        # Where each gene sits in the first parent, to tell which genes the segment kept
+        inverse = np.argsort(parents1, axis=1)
+        kept_position = np.take_along_axis(inverse, parents2, axis=1)
+        kept_gene = (kept_position >= start) & (kept_position < end)
+        in_segment = (positions >= start) & (positions < end)
+
+        # Stable sorts put the free genes (in parent-2 order) and free positions first
+        genes = np.take_along_axis(parents2, np.argsort(kept_gene, axis=1, kind='stable'), axis=1)
+        slots = np.argsort(in_segment, axis=1, kind='stable')
+        num_free = size - (end - start)
+        values = np.where(positions < num_free, genes, np.take_along_axis(parents1, slots, axis=1))
+
+        children = np.empty_like(parents1)
+        np.put_along_axis(children, slots, values, axis=1)
+        return children
+
+    def mutate(self, rng: np.random.Generator, population: np.ndarray) -> np.ndarray:
+        """Swap two random genes in each chromosome picked with probability ``mutation_rate``."""
+        rows = np.nonzero(rng.random(len(population)) < self.mutation_rate)[0]
+        size = population.shape[1]
+        if size < 2 or not len(rows):
+            return population
+        first = rng.integers(size, size=len(rows))
+        second = rng.integers(size, size=len(rows))
+        population[rows, first], population[rows, second] = population[rows, second], population[rows, first]
+        return population
+
+    def best_route(self, population: np.ndarray, lengths: np.ndarray, scores: np.ndarray) -> List[int]:
+        best = int(np.argmax(scores))
+        return self.rides[population[best, :lengths[best]]].tolist()
+
+    def run(self, time_budget: float = None, on_improvement: ImprovementCallback = None) -> Tuple[int, float]:
+        """Evolve the population; ``time_budget`` (seconds) stops between generations."""
+        if not len(self.rides):
+            self.path, self.total_time = [], 0
+            return 0, 0
+
+        deadline = Deadline(time_budget)
+        incumbent = Incumbent(on_improvement)
+        # Drawn from the global random state so seeding random keeps runs reproducible
+        rng = np.random.default_rng(random.getrandbits(64))
+        population = self.generate_population(rng, self.population_size)
+        lengths, times, scores = self.evaluate(population)
+
+        for generation in range(self.generations):
+            best_route = self.best_route(population, lengths, scores)
+            incumbent.offer(best_route, self.cost_model.route_time(best_route))
+            if self.observer is not None:
+                self.observer('generation', generation=generation, best_fitness=int(lengths.max()),
+                              mean_fitness=float(lengths.mean()), population=len(population))
+            if deadline.expired():
+                break
+            elite = population[np.argmax(scores)]
+            num_children = self.population_size - 1
+            parents1 = population[self.selection(rng, lengths, num_children)]
+            parents2 = population[self.selection(rng, lengths, num_children)]
+            children = self.mutate(rng, self.crossover(rng, parents1, parents2))
+            population = np.vstack((elite, children))
+            lengths, times, scores = self.evaluate(population)
+
+        best_route = self.best_route(population, lengths, scores)
+        incumbent.offer(best_route, self.cost_model.route_time(best_route))
+        best_solution = incumbent.path
+        total_time = self.cost_model.route_time(best_solution)
+        self.path = best_solution
+        self.total_time = total_time
+        return len(best_solution), total_time